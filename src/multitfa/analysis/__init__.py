@@ -1,3 +1,4 @@
 from .sampling_util import *
 from .sampling import *
+from .checkpoint import *
 from .variability import *
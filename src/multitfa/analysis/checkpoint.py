@@ -0,0 +1,245 @@
+import hashlib
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+
+__all__ = ["VariabilityLog", "model_fingerprint"]
+
+
+class VariabilityLog:
+    """Append-only SQLite log of the completed variables of a TVA run.
+
+    Every variable is written as soon as its min and max are known, so a run interrupted
+    (for example, pre-empted on a batch queue) can resume, skipping the variables
+    already in the log.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        path of the SQLite log file, created if it doesn't exist
+    timeout : float, optional
+        seconds to wait for the lock of a concurrent writer, by default 60
+    """
+
+    def __init__(self, path, timeout=60.0):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS variability "
+                "(variable TEXT NOT NULL, minimum REAL, maximum REAL, "
+                "minimum_status TEXT, maximum_status TEXT, solve_time REAL, "
+                "recorded_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS metadata "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+    def __repr__(self):
+        return "<VariabilityLog {}>".format(self.path)
+
+    def __len__(self):
+        return len(self.completed())
+
+    def _connect(self):
+        """Opens a new connection to the log, in autocommit mode.
+
+        Returns
+        -------
+        contextlib.closing
+            context manager closing the sqlite3 connection
+        """
+        connection = sqlite3.connect(
+            str(self.path), timeout=self.timeout, isolation_level=None
+        )
+        return closing(connection)
+
+    def validate(self, fingerprint):
+        """Ties the log to a run, see model_fingerprint.
+
+        The fingerprint of the first run is stored in the log. Resuming with a model
+        or settings of another fingerprint would reuse ranges of a different problem,
+        so the log is refused.
+
+        Parameters
+        ----------
+        fingerprint : str
+            fingerprint of the model and settings of the run
+
+        Raises
+        ------
+        ValueError
+            If the log was written by a run with another fingerprint
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO metadata VALUES ('fingerprint', ?)",
+                (fingerprint,),
+            )
+            (stored,) = connection.execute(
+                "SELECT value FROM metadata WHERE key = 'fingerprint'"
+            ).fetchone()
+        if stored != fingerprint:
+            raise ValueError(
+                "{} was written for another model or solver settings, use a new "
+                "checkpoint to run TVA on this model".format(self.path)
+            )
+
+    def append(
+        self, variable, minimum, maximum, minimum_status, maximum_status, solve_time
+    ):
+        """Appends a completed variable to the log.
+
+        Parameters
+        ----------
+        variable : str
+            reaction id or variable name
+        minimum, maximum : float
+            minimum and maximum of the variable, NaN or None are stored as NULL
+        minimum_status, maximum_status : str
+            solver status of the min and max solves
+        solve_time : float
+            wall time of the min and max solves in seconds
+        """
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO variability VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    variable,
+                    minimum,
+                    maximum,
+                    minimum_status,
+                    maximum_status,
+                    float(solve_time),
+                    time.time(),
+                ),
+            )
+
+    def completed(self):
+        """Variables in the log with their min and max.
+
+        The latest entry is used if a variable was logged more than once.
+
+        Returns
+        -------
+        dict
+            Dictionary of variable to (minimum, maximum)
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT variable, minimum, maximum FROM variability ORDER BY rowid"
+            ).fetchall()
+        return {
+            variable: (
+                minimum if minimum is not None else float("nan"),
+                maximum if maximum is not None else float("nan"),
+            )
+            for variable, minimum, maximum in rows
+        }
+
+
+def model_fingerprint(model, **settings):
+    """Fingerprint of the model and settings of a TVA run, to validate checkpoint logs.
+
+    SHA-256 digest of the model id, the solver interface and tolerances, the bounds
+    and types of the solver variables, the bounds and coefficients of the solver
+    constraints and the stoichiometry of the reactions. With the 'gurobi' or 'cplex'
+    solver setting, the quadratic constraints of the legacy interface of the model are
+    included too. The objective is left out, TVA replaces it.
+
+    Parameters
+    ----------
+    model : cobra.Model
+        model of the run
+    settings : dict
+        other settings of the run changing its results, for example time limits
+
+    Returns
+    -------
+    str
+        hexadecimal digest
+    """
+    digest = hashlib.sha256()
+
+    def update(*values):
+        digest.update(repr(values).encode())
+
+    tolerances = model.solver.configuration.tolerances
+    update(
+        model.id,
+        model.solver.interface.__name__,
+        getattr(tolerances, "feasibility", None),
+        getattr(tolerances, "optimality", None),
+        getattr(tolerances, "integrality", None),
+        sorted(settings.items()),
+    )
+    for variable in model.solver.variables:
+        update(variable.name, variable.lb, variable.ub, variable.type)
+    for constraint in model.solver.constraints:
+        update(constraint.name, constraint.lb, constraint.ub, _coefficients(constraint))
+    for reaction in model.reactions:
+        update(
+            reaction.id,
+            sorted((met.id, stoic) for met, stoic in reaction.metabolites.items()),
+        )
+    if settings.get("solver") == "gurobi":
+        for terms in _gurobi_quadratic_constraints(model.gurobi_interface):
+            update(*terms)
+    elif settings.get("solver") == "cplex":
+        for terms in _cplex_quadratic_constraints(model.cplex_interface):
+            update(*terms)
+    return digest.hexdigest()
+
+
+def _coefficients(constraint):
+    """Coefficients of an optlang constraint, sorted by variable name."""
+    if not constraint.is_Linear:
+        return str(constraint.expression)
+    coefficients = constraint.get_linear_coefficients(constraint.variables)
+    return sorted((variable.name, value) for variable, value in coefficients.items())
+
+
+def _gurobi_quadratic_constraints(gurobi_interface):
+    """Name, sense, right hand side, linear and quadratic terms of the Gurobi QCs."""
+    gurobi_interface.update()
+    for constraint in gurobi_interface.getQConstrs():
+        row = gurobi_interface.getQCRow(constraint)
+        linear = row.getLinExpr()
+        yield (
+            constraint.QCName,
+            constraint.QCSense,
+            constraint.QCRHS,
+            sorted(
+                (linear.getVar(i).VarName, linear.getCoeff(i))
+                for i in range(linear.size())
+            ),
+            sorted(
+                (row.getVar1(i).VarName, row.getVar2(i).VarName, row.getCoeff(i))
+                for i in range(row.size())
+            ),
+        )
+
+
+def _cplex_quadratic_constraints(cplex_interface):
+    """Name, sense, right hand side, linear and quadratic terms of the Cplex QCs."""
+    names = cplex_interface.variables.get_names()
+    quadratic_constraints = cplex_interface.quadratic_constraints
+    for i in range(quadratic_constraints.get_num()):
+        linear = quadratic_constraints.get_linear_components(i)
+        quadratic = quadratic_constraints.get_quadratic_components(i)
+        yield (
+            quadratic_constraints.get_names(i),
+            quadratic_constraints.get_senses(i),
+            quadratic_constraints.get_rhs(i),
+            sorted((names[j], value) for j, value in zip(linear.ind, linear.val)),
+            sorted(
+                (names[j], names[k], value)
+                for j, k, value in zip(quadratic.ind1, quadratic.ind2, quadratic.val)
+            ),
+        )
@@ -1,12 +1,134 @@
+import itertools
+import multiprocessing
+import threading
+from contextlib import closing
 from copy import copy, deepcopy
 
 import numpy as np
-from pandas import DataFrame, Series, concat
+from pandas import DataFrame, Series
 
 from .sampling_util import *
 from .variability import variability
 
 
+def _init_sampling_worker(model, variables, tva_processes=1):
+    """Initialize a global preprocessed model and the variables of the TVA.
+
+    The model is preprocessed with preprocess_model. Worker processes run the TVA of a
+    sample in a single process.
+    """
+    global _sampling
+    _sampling = {
+        "model": model,
+        "variables": variables,
+        "tva_processes": tva_processes,
+        "small_sphere_vars": model.variable_registry["sphere_small"],
+        "large_sphere_vars": model.variable_registry["sphere_large"],
+    }
+
+
+def _sampling_step(sample):
+    """Fixes the sphere variables of the global model to a sample and runs TVA.
+
+    Parameters
+    ----------
+    sample : tuple
+        small and large sphere samples
+
+    Returns
+    -------
+    pd.DataFrame
+        TVA ranges of the sample
+    """
+    small_sphr_sample, large_sphr_sample = sample
+
+    # Fix the component variable lb, ub to sampled formation energy
+    fix_sphere_variables(_sampling["small_sphere_vars"], small_sphr_sample)
+    fix_sphere_variables(_sampling["large_sphere_vars"], large_sphr_sample)
+
+    return variability(
+        _sampling["model"],
+        variable_list=_sampling["variables"],
+        processes=_sampling["tva_processes"],
+    )
+
+
+def _indexed_sampling_step(indexed_sample):
+    """Runs _sampling_step on an (index, sample) tuple, returns the index and ranges."""
+    index, sample = indexed_sample
+    return index, _sampling_step(sample)
+
+
+def _tva_samples(model, variables, sampler, processes=1):
+    """Yields the TVA ranges of the samples of the sampler, in sample order.
+
+    With more than one process, the samples are a work queue for worker processes
+    holding their own copy of the preprocessed model. A worker takes the next sample as
+    soon as it is done, and the results are put back in sample order. A seeded run
+    gives the same stream of ranges whatever the number of processes. Close the
+    generator to stop the workers.
+
+    Parameters
+    ----------
+    model : cobra model
+        preprocessed model
+    variables : list
+        variables to perform TVA on
+    sampler : SphereSampler
+        sampler of the small and large spheres
+    processes : int, optional
+        number of worker processes, by default 1
+
+    Yields
+    ------
+    pd.DataFrame
+        TVA ranges of the next sample
+    """
+    if processes > 1:
+        # The pool draws tasks eagerly, slots bound the samples in flight
+        slots, stop = (threading.Semaphore(2 * processes), threading.Event())
+
+        def queued_samples():
+            # Samples are drawn in this process, workers only solve them
+            for index in itertools.count():
+                slots.acquire()
+                if stop.is_set():
+                    return
+                yield index, next(sampler)
+
+        with multiprocessing.Pool(
+            processes,
+            initializer=_init_sampling_worker,
+            initargs=(model, variables, 1),
+        ) as pool:
+            finished, next_index = ({}, 0)
+            try:
+                for index, tva_ranges in pool.imap_unordered(
+                    _indexed_sampling_step, queued_samples(), chunksize=1
+                ):
+                    slots.release()
+                    finished[index] = tva_ranges
+                    while next_index in finished:
+                        yield finished.pop(next_index)
+                        next_index += 1
+            finally:
+                # Wakes up the task feeder so that the pool can be terminated
+                stop.set()
+                slots.release()
+    else:
+        _init_sampling_worker(model, variables)
+        for sample in sampler:
+            yield _sampling_step(sample)
+
+
+def _collect_solves(tva_ranges, solves, callback=None):
+    """Adds the solve records of the TVA of a sample to solves and to the callback."""
+    solves.extend(tva_ranges.attrs["solves"])
+    if callback is not None:
+        for record in tva_ranges.attrs["solves"]:
+            callback(record)
+
+
 def cutoff_sampling(
     model_variability,
     cutoff=100,
@@ -14,6 +136,11 @@ def cutoff_sampling(
     min_growth=False,
     fraction_of_optim=0.9,
     solver_name=None,
+    callback=None,
+    seed=None,
+    sobol=False,
+    processes=1,
+    buffer_path=None,
 ):
     """Implements the quadratic constraint using repeated sampling on the surface of ellipsoid. Exits when 100 consecutive samples represent better solution. We fix the component sphere variables lb & ub to the sampled covariance and solve the problem.
 
@@ -31,11 +158,31 @@ def cutoff_sampling(
         fraction of original growth/flux value, by default 0.9
     solver_name : str, optional
         preferred solver, if not specified and has more than one solver uses the same solver order as cobra, by default 0.9
+    callback : function, optional
+        called with the SolveRecord of every TVA solve of every sample, in sample order,
+        the records of all the samples are also stored in the 'solves' entry of
+        Whole_ranges.attrs (see solve_report), by default None
+    seed : int, optional
+        seed of the sphere samples, runs with the same seed draw the same samples, by
+        default None
+    sobol : bool, optional
+        If True, sample quasi-random Sobol directions on the spheres (see
+        SphereSampler), by default False
+    processes : int, optional
+        number of worker processes solving samples in parallel, each with its own copy
+        of the preprocessed model. Samples are drawn from one seeded stream and merged
+        in sample order, so results don't depend on the number of processes, by default
+        1
+    buffer_path : str or pathlib.Path, optional
+        file to memory map the ranges of all the samples to, for very long runs (see
+        RangeBuffer), by default None
 
     Returns
     -------
     tuple
-        tuple of no.of samples taken to achieve optima and optimal ranges of variables (pd.Dataframe)
+        tuple of optimal ranges of variables (pd.Dataframe), ranges of every sample
+        (pd.Dataframe with (bound, sample) columns) and no.of samples taken to achieve
+        optima
 
     Raises
     ------
@@ -49,12 +196,8 @@ def cutoff_sampling(
         model.solver = solver_name
 
     # Retrieve small and large sphere variables
-    small_sphere_vars = [
-        var for var in model.variables if var.name.startswith("Sphere_s_")
-    ]
-    large_sphere_vars = [
-        var for var in model.variables if var.name.startswith("Sphere_l_")
-    ]
+    small_sphere_vars = model.variable_registry["sphere_small"]
+    large_sphere_vars = model.variable_registry["sphere_large"]
 
     if variable_list == None:
         variables = [var.name for var in model.solver.variables]
@@ -87,57 +230,36 @@ def cutoff_sampling(
         np.zeros((len(variables), 2)), columns=["minimum", "maximum"]
     )
 
-    Whole_ranges = DataFrame(
-        {
-            "minimum": Series(index=variables, data=np.empty(len(variables))),
-            "maximum": Series(index=variables, data=np.empty(len(variables))),
-        }
-    )
+    whole_ranges = RangeBuffer(variables, path=buffer_path)
 
-    n_improvement, total_samples = (0, 0)
-    while n_improvement < cutoff:
-        total_samples = total_samples + 1
-
-        # Sample for components energy covariance ellipsoid
-        small_sphr_sample = generate_n_sphere_sample(len(small_sphere_vars))
-        large_sphr_sample = generate_n_sphere_sample(len(large_sphere_vars))
-
-        # Fix the component variable lb, ub to sampled formation energy
-        if len(small_sphere_vars) > 0:
-            for i in range(len(small_sphere_vars)):
-                # To avoid lb > ub fix them to larger bounds
-                small_sphere_vars[i].lb = -1000
-                small_sphere_vars[i].ub = 1000
-
-                small_sphere_vars[i].lb = small_sphr_sample[i]
-                small_sphere_vars[i].ub = small_sphr_sample[i]
-
-        if len(large_sphere_vars) > 0:
-            for i in range(len(large_sphere_vars)):
-                # To avoid lb > ub fix them to larger bounds
-                large_sphere_vars[i].lb = -1000
-                large_sphere_vars[i].ub = 1000
-
-                large_sphere_vars[i].lb = large_sphr_sample[i]
-                large_sphere_vars[i].ub = large_sphr_sample[i]
-
-        tva_ranges = variability(model, variable_list=variables)
-        if tva_ranges.empty or tva_ranges.isnull().all()["maximum"]:
-            total_samples = total_samples - 1
-            continue
-        else:
-            flags = compare_dataframes(representative_ranges, tva_ranges)
-            Y_count = flags.count("Y")
-            # print(tva_ranges)
-            if Y_count > 0.05 * len(flags):
-                n_improvement = 0
-                representative_ranges = tva_ranges
+    sampler = SphereSampler(
+        [len(small_sphere_vars), len(large_sphere_vars)], seed=seed, sobol=sobol
+    )
+    n_improvement, total_samples, solves = (0, 0, [])
+    with closing(_tva_samples(model, variables, sampler, processes)) as tva_samples:
+        while n_improvement < cutoff:
+            total_samples = total_samples + 1
+
+            tva_ranges = next(tva_samples)
+            _collect_solves(tva_ranges, solves, callback)
+            if tva_ranges.empty or tva_ranges.isnull().all()["maximum"]:
+                total_samples = total_samples - 1
+                continue
             else:
-                n_improvement = n_improvement + 1
-
-            Whole_ranges = concat([Whole_ranges, tva_ranges], axis=1)
-
-        lastone = tva_ranges
+                flags = compare_dataframes(representative_ranges, tva_ranges)
+                Y_count = flags.count("Y")
+                # print(tva_ranges)
+                if Y_count > 0.05 * len(flags):
+                    n_improvement = 0
+                    representative_ranges = tva_ranges
+                else:
+                    n_improvement = n_improvement + 1
+
+                whole_ranges.append(tva_ranges)
+
+            lastone = tva_ranges
+    Whole_ranges = whole_ranges.to_frame()
+    Whole_ranges.attrs["solves"] = solves
     return representative_ranges, Whole_ranges, total_samples
 
 
@@ -148,6 +270,11 @@ def gev_sampling(
     min_growth=False,
     fraction_of_optim=0.9,
     solver_name=None,
+    callback=None,
+    seed=None,
+    sobol=False,
+    processes=1,
+    buffer_path=None,
 ):
     """Implements the quadratic constraint using repeated sampling on the surface of ellipsoid. After sampling for fixed number of times, we use generalised extreme value distribution to predict the possible extremum of the distribution. We fix the component sphere variables lb & ub to the sampled covariance and solve the problem.
 
@@ -165,6 +292,24 @@ def gev_sampling(
         fraction of original growth/flux value, by default 0.9
     solver_name : str, optional
         preferred solver, if not specified and has more than one solver uses the same solver order as cobra, by default 0.9
+    callback : function, optional
+        called with the SolveRecord of every TVA solve of every sample, in sample order,
+        the records of all the samples are also stored in the 'solves' entry of
+        Whole_ranges.attrs (see solve_report), by default None
+    seed : int, optional
+        seed of the sphere samples, runs with the same seed draw the same samples, by
+        default None
+    sobol : bool, optional
+        If True, sample quasi-random Sobol directions on the spheres (see
+        SphereSampler), by default False
+    processes : int, optional
+        number of worker processes solving samples in parallel, each with its own copy
+        of the preprocessed model. Samples are drawn from one seeded stream and merged
+        in sample order, so results don't depend on the number of processes, by default
+        1
+    buffer_path : str or pathlib.Path, optional
+        file to memory map the ranges of all the samples to, for very long runs (see
+        RangeBuffer), by default None
 
     Returns
     -------
@@ -179,12 +324,8 @@ def gev_sampling(
         model.solver = solver_name
 
     # Retrieve small and large sphere variables
-    small_sphere_vars = [
-        var for var in model.variables if var.name.startswith("Sphere_s_")
-    ]
-    large_sphere_vars = [
-        var for var in model.variables if var.name.startswith("Sphere_l_")
-    ]
+    small_sphere_vars = model.variable_registry["sphere_small"]
+    large_sphere_vars = model.variable_registry["sphere_large"]
 
     if variable_list == None:
         variables = [var.name for var in model.solver.variables]
@@ -210,50 +351,29 @@ def gev_sampling(
 
         model.add_cons_vars([fva_old_obj_constraint, fva_old_objective])
 
-    Whole_ranges = DataFrame(
-        {
-            "minimum": Series(index=variables, data=np.empty(len(variables))),
-            "maximum": Series(index=variables, data=np.empty(len(variables))),
-        }
-    )
+    whole_ranges = RangeBuffer(variables, capacity=cutoff, path=buffer_path)
 
-    total_samples = 0
+    sampler = SphereSampler(
+        [len(small_sphere_vars), len(large_sphere_vars)], seed=seed, sobol=sobol
+    )
+    total_samples, solves = (0, [])
     mins = []
     maxs = []
 
-    while total_samples < cutoff:
-        total_samples = total_samples + 1
+    with closing(_tva_samples(model, variables, sampler, processes)) as tva_samples:
+        while total_samples < cutoff:
+            total_samples = total_samples + 1
 
-        # Sample for components energy covariance ellipsoid
-        small_sphr_sample = generate_n_sphere_sample(len(small_sphere_vars))
-        large_sphr_sample = generate_n_sphere_sample(len(large_sphere_vars))
+            tva_ranges = next(tva_samples)
+            _collect_solves(tva_ranges, solves, callback)
 
-        # Fix the component variable lb, ub to sampled formation energy
-        if len(small_sphere_vars) > 0:
-            for i in range(len(small_sphere_vars)):
-                # To avoid lb > ub fix them to larger bounds
-                small_sphere_vars[i].lb = -1000
-                small_sphere_vars[i].ub = 1000
-
-                small_sphere_vars[i].lb = small_sphr_sample[i]
-                small_sphere_vars[i].ub = small_sphr_sample[i]
-
-        if len(large_sphere_vars) > 0:
-            for i in range(len(large_sphere_vars)):
-                # To avoid lb > ub fix them to larger bounds
-                large_sphere_vars[i].lb = -1000
-                large_sphere_vars[i].ub = 1000
-
-                large_sphere_vars[i].lb = large_sphr_sample[i]
-                large_sphere_vars[i].ub = large_sphr_sample[i]
-
-        tva_ranges = variability(model, variable_list=variables)
-
-        if tva_ranges.empty or tva_ranges.isnull().all()["maximum"]:
-            total_samples = total_samples - 1
-            continue
-        # print(total_samples, tva_ranges)
-        Whole_ranges = concat([Whole_ranges, tva_ranges], axis=1)
+            if tva_ranges.empty or tva_ranges.isnull().all()["maximum"]:
+                total_samples = total_samples - 1
+                continue
+            # print(total_samples, tva_ranges)
+            whole_ranges.append(tva_ranges)
+    Whole_ranges = whole_ranges.to_frame()
+    Whole_ranges.attrs["solves"] = solves
 
     for var in variables:
         min_delG, max_d = extreme_value_distribution(Whole_ranges.loc[var, "minimum"])
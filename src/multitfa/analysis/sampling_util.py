@@ -1,5 +1,6 @@
 import numpy as np
 from optlang import Constraint
+from pandas import DataFrame, MultiIndex
 from scipy import stats
 
 from ..util.constraints import *
@@ -7,28 +8,37 @@ from ..util.linalg_fun import *
 from ..util.thermo_constants import *
 
 
-def generate_n_sphere_sample(n_variables):
+def generate_n_sphere_sample(n_variables, n_samples=None, rng=None):
     """Generates unit n-sphere sample. Works by picking random sample from normal distribution and normalized by radius.
 
     Parameters
     ----------
     n_variables : int
         number of variables, dimension of the required sphere
+    n_samples : int, optional
+        number of samples, drawn at once as a (n_samples, n_variables) array, by default
+        None (a single sample)
+    rng : np.random.Generator, optional
+        random generator, by default numpy's global random state
 
     Returns
     -------
     np.array
         n-sphere sample with required dimensions
     """
+    size = n_variables if n_samples is None else (n_samples, n_variables)
     # n-sphere sample from N(0,1)
-    random_sample = np.random.normal(loc=0, scale=1.0, size=(n_variables))
-    circle_radius = np.sqrt(np.sum(np.square(random_sample)))
+    if rng is None:
+        random_sample = np.random.normal(loc=0, scale=1.0, size=size)
+    else:
+        random_sample = rng.standard_normal(size)
+    circle_radius = np.linalg.norm(random_sample, axis=-1, keepdims=True)
     normalized_sample = random_sample / circle_radius
 
     return normalized_sample
 
 
-def generate_ellipsoid_sample(cholesky):
+def generate_ellipsoid_sample(cholesky, n_samples=None, rng=None):
     """sampling on the surface of n-dimensional ellipsoid
     sample on n-ellipsoid  is linear transformation of unit n-sphere
     N(mu,var) = mu + A @ N(0,1)
@@ -38,6 +48,11 @@ def generate_ellipsoid_sample(cholesky):
     ----------
     cholesky : np.ndarray
         cholesky matrix
+    n_samples : int, optional
+        number of samples, transformed with one matrix product as a (n_samples,
+        n_dimensions) array, by default None (a single sample)
+    rng : np.random.Generator, optional
+        random generator, by default numpy's global random state
 
     Returns
     -------
@@ -45,14 +60,196 @@ def generate_ellipsoid_sample(cholesky):
         numpy array containing ellipsoid sample with cholesky matrix length
     """
 
-    n_dimensions = len(cholesky)
-    chi_crit_val = chi2.isf(q=0.05, df=n_dimensions)
-    n_sphere_sample = generate_n_sphere_sample(n_dimensions)
-    ellipsoid_sample = np.sqrt(chi_crit_val) * cholesky @ n_sphere_sample
+    n_dimensions = cholesky.shape[1]
+    chi_crit_val = stats.chi2.isf(q=0.05, df=n_dimensions)
+    n_sphere_sample = generate_n_sphere_sample(n_dimensions, n_samples, rng)
+    ellipsoid_sample = np.sqrt(chi_crit_val) * n_sphere_sample @ cholesky.T
 
     return ellipsoid_sample
 
 
+class SphereSampler:
+    """Draws samples on the surface of unit n-spheres in blocks.
+
+    Every block is a (block_size, dimension) array per sphere, drawn with one call of a
+    seeded np.random.Generator, and iterating over the sampler yields a tuple with one
+    sample per sphere. With Sobol directions, scrambled Sobol points are mapped through
+    the inverse normal CDF before normalizing, which covers the sphere more evenly than
+    pseudo-random directions.
+
+    Parameters
+    ----------
+    dimensions : list
+        dimensions of the spheres, e.g. the number of small and large sphere variables
+    seed : int, np.random.SeedSequence or np.random.Generator, optional
+        seed of the random generator, by default None (fresh entropy)
+    block_size : int, optional
+        number of samples drawn at a time, rounded up to a power of two for Sobol
+        directions, by default 1024
+    sobol : bool, optional
+        If True, use quasi-random Sobol directions (requires scipy >= 1.7), by default
+        False
+    """
+
+    def __init__(self, dimensions, seed=None, block_size=1024, sobol=False):
+        self.dimensions = [int(dimension) for dimension in dimensions]
+        self.rng = np.random.default_rng(seed)
+        self.sobol = sobol
+        if sobol:
+            from scipy.stats import qmc
+
+            # Sobol sequences are balanced for blocks of 2 ** m points
+            self.block_size = 1 << max(0, int(block_size - 1).bit_length())
+            self._engines = [
+                (
+                    qmc.Sobol(d=dimension, scramble=True, seed=self.rng)
+                    if dimension > 0
+                    else None
+                )
+                for dimension in self.dimensions
+            ]
+        else:
+            self.block_size = block_size
+        self._block, self._position = (None, self.block_size)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._position >= self.block_size:
+            self._block, self._position = (self.block(), 0)
+        sample = tuple(block[self._position] for block in self._block)
+        self._position += 1
+        return sample
+
+    def _directions(self, index, n_samples):
+        """Normal distributed directions of a sphere, from Sobol or the generator."""
+        dimension = self.dimensions[index]
+        if not self.sobol or dimension == 0:
+            return self.rng.standard_normal((n_samples, dimension))
+        points = self._engines[index].random(n_samples)
+        # Keep the points off 0 and 1, where the inverse CDF is infinite
+        eps = np.finfo(float).eps
+        return stats.norm.ppf(np.clip(points, eps, 1 - eps))
+
+    def block(self, n_samples=None):
+        """Draws a block of samples of every sphere.
+
+        Parameters
+        ----------
+        n_samples : int, optional
+            number of samples, by default the block size
+
+        Returns
+        -------
+        list
+            (n_samples, dimension) array of unit sphere samples per sphere
+        """
+        n_samples = self.block_size if n_samples is None else n_samples
+        blocks = []
+        for index, dimension in enumerate(self.dimensions):
+            directions = self._directions(index, n_samples)
+            if dimension > 0:
+                directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+            blocks.append(directions)
+        return blocks
+
+
+class RangeBuffer:
+    """Accumulates the TVA ranges of a sampling run in a growing array.
+
+    The ranges are kept in a (capacity, n_variables, 2) array, which doubles its
+    capacity when full, so every sample is a single row copy. With a path the buffer is
+    a memory mapped file, grown in place, for runs too long to keep in memory. The
+    DataFrame is only built at the end, see to_frame.
+
+    Parameters
+    ----------
+    variables : list
+        variables of the TVA ranges
+    capacity : int, optional
+        number of samples allocated up front, by default 256
+    path : str or pathlib.Path, optional
+        file of the memory mapped buffer, overwritten if it exists, by default None (in
+        memory)
+    """
+
+    def __init__(self, variables, capacity=256, path=None):
+        self.variables = list(variables)
+        self.path = path
+        self.n_samples = 0
+        if path is not None:
+            open(path, "wb").close()
+        self._buffer = self._allocate(max(1, capacity))
+
+    def __len__(self):
+        return self.n_samples
+
+    def _allocate(self, capacity):
+        """Allocates a buffer of capacity samples, keeping the appended samples."""
+        shape = (capacity, len(self.variables), 2)
+        if self.path is None:
+            buffer = np.empty(shape)
+            if self.n_samples:
+                buffer[: self.n_samples] = self._buffer[: self.n_samples]
+            return buffer
+        # Samples are C ordered rows, so extending the file keeps them in place
+        with open(self.path, "r+b") as handle:
+            handle.truncate(int(np.prod(shape)) * np.dtype(float).itemsize)
+        return np.memmap(self.path, dtype=float, mode="r+", shape=shape)
+
+    @property
+    def values(self):
+        """(n_samples, n_variables, 2) array of the minimum and maximum ranges."""
+        return self._buffer[: self.n_samples]
+
+    def append(self, tva_ranges):
+        """Appends the TVA ranges of a sample.
+
+        Parameters
+        ----------
+        tva_ranges : pd.DataFrame
+            Dataframe of min max ranges of the variables
+        """
+        if self.n_samples == len(self._buffer):
+            self._buffer = self._allocate(2 * len(self._buffer))
+        self._buffer[self.n_samples] = tva_ranges.reindex(self.variables)[
+            ["minimum", "maximum"]
+        ].values
+        self.n_samples += 1
+
+    def to_frame(self):
+        """Dataframe of the appended ranges.
+
+        Returns
+        -------
+        pd.DataFrame
+            Dataframe of the variables and (bound, sample) columns, e.g.
+            frame["minimum"] is the variables by samples DataFrame of minimums
+        """
+        data = self.values.transpose(1, 2, 0).reshape(len(self.variables), -1)
+        columns = MultiIndex.from_product(
+            [["minimum", "maximum"], range(self.n_samples)], names=["bound", "sample"]
+        )
+        return DataFrame(data, index=self.variables, columns=columns)
+
+
+def fix_sphere_variables(variables, sample):
+    """Fixes the lb and ub of the sphere variables to a sample.
+
+    Both bounds are set at once, so the old bounds can't conflict with the new ones.
+
+    Parameters
+    ----------
+    variables : list
+        optlang sphere variables
+    sample : np.ndarray
+        sampled values of the variables
+    """
+    for variable, value in zip(variables, sample):
+        variable.set_bounds(value, value)
+
+
 def preprocess_model(model):
     """This function preprocess the model for the sampling on the surface of the ellipsoid method. We first remove the existing dG constraint and associated error variables. Then add the sphere variables. Depending on the variance range of covariance matrix, we split the sphere variables in two ellipsoids.
 
@@ -67,12 +264,11 @@ def preprocess_model(model):
         preprocessed model with modified thermo constraints to work on sampling approach
     """
     # First remove the delG constraint and associated variables, we will add them later
+    registry = model.variable_registry
     remove_vars = [
         var
-        for var in model.variables
-        if var.name.startswith("component_")
-        or var.name.startswith("dG_err_")
-        or var.name.startswith("Sphere_")
+        for kind in ("component", "error", "sphere_small", "sphere_large")
+        for var in registry[kind]
     ]
     remove_cons = [
         cons
@@ -83,35 +279,19 @@ def preprocess_model(model):
     # Remove the variables and constraints from the model
     model.remove_cons_vars(remove_cons + remove_vars)
 
-    # Pick indices of components present in the current model
-    model_component_indices = [
-        i
-        for i in range(model.compound_vector_matrix.shape[1])
-        if np.any(model.compound_vector_matrix[:, i])
-    ]
+    # Cached decomposition of the covariance of the components present in the model
+    decomposition = model.covariance_decomposition
+    high_variance_indices = decomposition.high_variance_indices
+    low_variance_indices = decomposition.low_variance_indices
 
     # Reduced the compound_vector to contain only the non zero entries
-    model_compound_vector = model.compound_vector_matrix[:, model_component_indices]
-
-    # Now extract the sub covariance matrix containing only the components present in the model
-    component_model_covariance = covariance[:, model_component_indices][
-        model_component_indices, :
+    model_compound_vector = model.compound_vector_matrix[
+        :, decomposition.component_indices
     ]
 
-    # Now separate the compounds that have variance > 1000 and others to avoid numerical issues
-    high_variance_indices = np.where(np.diag(component_model_covariance) > 1000)[0]
-    low_variance_indices = np.where(np.diag(component_model_covariance) < 1000)[0]
-
-    # Calculate cholesky matrix for two different covariance matrices
     if len(low_variance_indices) > 0:
-        small_component_covariance = component_model_covariance[
-            :, low_variance_indices
-        ][low_variance_indices, :]
-
-        cholesky_small_variance = matrix_decomposition(small_component_covariance)
-        chi2_value_small = stats.chi2.isf(
-            q=0.05, df=cholesky_small_variance.shape[1]
-        )  # Chi-square value to map confidence interval
+        cholesky_small_variance = decomposition.cholesky_small
+        chi2_value_small = decomposition.chi2_small
 
         sphere_s_vars = np.array(
             [
@@ -121,25 +301,13 @@ def preprocess_model(model):
         )  # adding sphere variables for low variance compounds
         model.add_cons_vars(sphere_s_vars.tolist())
 
-        for i in high_variance_indices:
-            zeros_axis = np.zeros((cholesky_small_variance.shape[1],))
-            cholesky_small_variance = np.insert(
-                cholesky_small_variance, i, zeros_axis, axis=0
-            )
-
         metabolite_sphere_small = (
             model_compound_vector @ cholesky_small_variance
         )  # This is a fixed term compound_vector @ cholesky
 
     if len(high_variance_indices) > 0:
-        large_component_covariance = component_model_covariance[
-            :, high_variance_indices
-        ][
-            high_variance_indices, :
-        ]  # Covariance matrix for the high variance components
-
-        cholesky_large_variance = matrix_decomposition(large_component_covariance)
-        chi2_value_high = stats.chi2.isf(q=0.05, df=cholesky_large_variance.shape[1])
+        cholesky_large_variance = decomposition.cholesky_large
+        chi2_value_high = decomposition.chi2_large
 
         sphere_l_vars = np.array(
             [
@@ -149,22 +317,12 @@ def preprocess_model(model):
         )  # adding sphere variables for high variance compounds
         model.add_cons_vars(sphere_l_vars.tolist())
 
-        # Insert empty rows for the low_variance_components
-        for i in low_variance_indices:
-            zeros_axis = np.zeros((cholesky_large_variance.shape[1],))
-            cholesky_large_variance = np.insert(
-                cholesky_large_variance, i, zeros_axis, axis=0
-            )
         metabolite_sphere_large = (
             model_compound_vector @ cholesky_large_variance
         )  # This is a fixed term compound_vector @ cholesky
 
-    small_sphere_vars = np.array(
-        [var for var in model.variables if var.name.startswith("Sphere_s_")]
-    )
-    large_sphere_vars = np.array(
-        [var for var in model.variables if var.name.startswith("Sphere_l_")]
-    )
+    small_sphere_vars = registry["sphere_small"]
+    large_sphere_vars = registry["sphere_large"]
 
     delG_constraints = []
     for rxn in model.reactions:
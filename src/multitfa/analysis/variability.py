@@ -1,10 +1,739 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import namedtuple
 from copy import copy
 
 import numpy as np
+import scipy.sparse as sp
 from pandas import DataFrame, Series
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+from .checkpoint import VariabilityLog, model_fingerprint
+
+
+logger = logging.getLogger(__name__)
+
+#: Status of solves skipped because the envelope attains the relaxation bound
+ATTAINED = "attained"
+
+SolveRecord = namedtuple(
+    "SolveRecord",
+    [
+        "variable",
+        "sense",
+        "solve_time",
+        "status",
+        "mip_gap",
+        "node_count",
+        "time_limit",
+    ],
+)
+SolveRecord.__doc__ = """Record of a single min or max solve of a TVA run.
+
+variable : str
+    reaction id or variable name
+sense : str
+    'min' or 'max'
+solve_time : float
+    wall time of the solve in seconds
+status : str
+    solver status of the solve, 'attained' if the solve was skipped
+mip_gap : float
+    relative MIP gap at the end of the solve, NaN if the solver doesn't report it
+node_count : float
+    number of branch and bound nodes explored, NaN if the solver doesn't report it
+time_limit : bool
+    True if the solve stopped at the time limit, the value is then the best incumbent
+    and not a proven optimum
+"""
+
+_GUROBI_STATUS = {
+    1: "loaded",
+    2: "optimal",
+    3: "infeasible",
+    4: "inf_or_unbd",
+    5: "unbounded",
+    6: "cutoff",
+    7: "iteration_limit",
+    8: "node_limit",
+    9: "time_limit",
+    10: "solution_limit",
+    11: "interrupted",
+    12: "numeric",
+    13: "suboptimal",
+    14: "inprogress",
+    15: "user_obj_limit",
+}
+
+
+def _reaction_variables(model):
+    """Dictionary of reaction id to the names of its forward and reverse variables."""
+    return {
+        rxn.id: (rxn.forward_variable.name, rxn.reverse_variable.name)
+        for rxn in model.reactions
+    }
+
+
+def _objective_terms(reaction_variables, variable):
+    """Variable names and coefficients of the TVA objective of a variable.
+
+    The objective of a reaction id is its forward - reverse variables.
+
+    Parameters
+    ----------
+    reaction_variables : dict
+        Dictionary of reaction id to names of the forward and reverse variables
+    variable : str
+        reaction id or variable name
+
+    Returns
+    -------
+    list
+        list of (variable name, coefficient) tuples
+    """
+    if variable in reaction_variables:
+        forward, reverse = reaction_variables[variable]
+        return [(forward, 1), (reverse, -1)]
+    return [(variable, 1)]
+
+
+class _Envelope:
+    """Running minimum and maximum of the TVA variables over feasible solutions.
+
+    The envelope is updated with all the integer feasible primal solutions seen during
+    a run. Every value in the envelope is attained by a feasible solution, so the MIP
+    minimum (maximum) of a variable is at most (at least) its envelope value. The
+    envelope can be moved to shared memory, so that worker processes harvest into and
+    read from the same envelope.
+
+    Parameters
+    ----------
+    variables : list
+        reaction ids or variable names
+    reaction_variables : dict
+        Dictionary of reaction id to names of the forward and reverse variables
+    """
+
+    def __init__(self, variables, reaction_variables):
+        self.index = {variable: i for i, variable in enumerate(variables)}
+        terms = [_objective_terms(reaction_variables, v) for v in variables]
+        self.names = list({name: None for term in terms for name, _ in term})
+        name_index = {name: i for i, name in enumerate(self.names)}
+
+        # Objective of variable i is values[plus[i]] - values[minus[i]], last value is 0
+        self.plus = np.full(len(variables), len(self.names))
+        self.minus = np.full(len(variables), len(self.names))
+        for i, term in enumerate(terms):
+            for name, coefficient in term:
+                if coefficient > 0:
+                    self.plus[i] = name_index[name]
+                else:
+                    self.minus[i] = name_index[name]
+
+        self.minimum = np.full(len(variables), np.inf)
+        self.maximum = np.full(len(variables), -np.inf)
+        self._shared = None
+
+    def share(self):
+        """Moves the envelope to shared memory.
+
+        Worker processes receiving the envelope as initializer argument update the same
+        arrays.
+        """
+        self._shared = (
+            multiprocessing.Array("d", self.minimum.tolist()),
+            multiprocessing.Array("d", self.maximum.tolist()),
+        )
+        self._attach()
+
+    def _attach(self):
+        shared_minimum, shared_maximum = self._shared
+        self.minimum = np.frombuffer(shared_minimum.get_obj())
+        self.maximum = np.frombuffer(shared_maximum.get_obj())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self._shared is not None:
+            del state["minimum"], state["maximum"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._shared is not None:
+            self._attach()
+
+    def harvest(self, values):
+        """Updates the envelope with a feasible primal solution.
+
+        Parameters
+        ----------
+        values : array-like
+            primal values of the variables in self.names order
+        """
+        values = np.append(np.asarray(values, dtype=float), 0.0)
+        values = values[self.plus] - values[self.minus]
+        if self._shared is None:
+            self._update(values)
+        else:
+            with self._shared[0].get_lock():
+                self._update(values)
+
+    def _update(self, values):
+        np.minimum(self.minimum, values, out=self.minimum)
+        np.maximum(self.maximum, values, out=self.maximum)
+
+    def harvest_primals(self, primal_values):
+        """Updates the envelope with a feasible primal solution.
+
+        The solution is a dictionary of variable name to primal value.
+        """
+        self.harvest([primal_values[name] for name in self.names])
+
+    def attained(self, variable, direction, bound, tolerance):
+        """Checks if the envelope reaches a relaxation bound of the variable.
+
+        The bound is then the MIP optimum and the solve can be skipped.
+
+        Parameters
+        ----------
+        variable : str
+            reaction id or variable name
+        direction : str
+            'min' or 'max'
+        bound : float or None
+            relaxation bound of the variable in the given direction
+        tolerance : float
+            absolute/relative tolerance to compare the envelope to the bound
 
+        Returns
+        -------
+        float or None
+            envelope value if it attains the bound, otherwise None
+        """
+        if bound is None or variable not in self.index:
+            return None
+        i = self.index[variable]
+        value = self.minimum[i] if direction == "min" else self.maximum[i]
+        gap = value - bound if direction == "min" else bound - value
+        if gap <= tolerance * (1 + abs(bound)):
+            return value
+        return None
+
+
+def _is_integral(values, tolerance):
+    """Checks if indicator values are within the integrality tolerance of 0 or 1."""
+    values = np.asarray(values, dtype=float)
+    return bool(np.all(np.abs(values - np.round(values)) <= max(tolerance, 1e-6)))
+
+
+def _indicator_names(model):
+    """Names of the indicator variables of the model, from its variable registry."""
+    return model.variable_registry.names("indicator")
+
+
+def _solver_statistics(problem):
+    """MIP gap and node count of the last solve of a Gurobi or Cplex problem.
+
+    NaN for other solvers and continuous problems.
+    """
+    try:
+        return problem.MIPGap, problem.NodeCount
+    except Exception:
+        pass
+    try:
+        return (
+            problem.solution.MIP.get_mip_relative_gap(),
+            problem.solution.progress.get_num_nodes_processed(),
+        )
+    except Exception:
+        return np.nan, np.nan
+
+
+def _solve_record(variable, sense, start, status, time_limit=False, problem=None):
+    """SolveRecord of a solve started at start (time.perf_counter).
+
+    The MIP statistics of the problem are included if given.
+    """
+    mip_gap, node_count = (
+        _solver_statistics(problem) if problem is not None else (np.nan, np.nan)
+    )
+    return SolveRecord(
+        variable,
+        sense,
+        time.perf_counter() - start,
+        status,
+        mip_gap,
+        node_count,
+        time_limit,
+    )
+
+
+def _cplex_time_limit(cplex_model):
+    """Checks if the last solve of a Cplex problem stopped at the time limit."""
+    status = cplex_model.solution.status
+    return cplex_model.solution.get_status() in (
+        status.MIP_time_limit_feasible,
+        status.MIP_time_limit_infeasible,
+        status.abort_time_limit,
+    )
+
+
+def _statistics(n_variables, relaxation_solves, records, resumed=0):
+    """Solve statistics of a TVA run, logged and stored in the DataFrame.attrs."""
+    skipped = sum(record.status == ATTAINED for record in records)
+    statistics = {
+        "lp_solves": relaxation_solves,
+        "milp_solves": len(records) - skipped,
+        "avoided_solves": skipped,
+        "resumed_variables": resumed,
+    }
+    logger.info(
+        "TVA of {} variables: {lp_solves} relaxation solves, {milp_solves} MIP solves, "
+        "{avoided_solves} MIP solves avoided, {resumed_variables} variables resumed "
+        "from checkpoint".format(n_variables, **statistics)
+    )
+    return statistics
+
+
+def _open_checkpoint(checkpoint, model, **settings):
+    """Opens the checkpoint log of a TVA run, validated against the model fingerprint.
+
+    Parameters
+    ----------
+    checkpoint : str, pathlib.Path, VariabilityLog or None
+        path of the log or the log itself
+    model : cobra.Model
+        model of the run, see model_fingerprint
+    settings : dict
+        other settings of the run changing its results
+
+    Returns
+    -------
+    tuple
+        the VariabilityLog (None without checkpoint) and the dictionary of already
+        completed variables to (minimum, maximum)
+    """
+    if checkpoint is None:
+        return None, {}
+    if not isinstance(checkpoint, VariabilityLog):
+        checkpoint = VariabilityLog(checkpoint)
+    checkpoint.validate(model_fingerprint(model, **settings))
+    return checkpoint, checkpoint.completed()
+
+
+def _run_steps(
+    step,
+    variables,
+    processes,
+    initializer,
+    initargs,
+    chunksize=1,
+    log=None,
+    callback=None,
+):
+    """Runs the TVA step of every variable, serially or on a pool of worker processes.
+
+    Results are collected as they finish. Completed variables are appended to the
+    checkpoint log straight away, so an interrupted run loses at most the variables in
+    flight.
+
+    Parameters
+    ----------
+    step : function
+        step function returning variable, minimum, maximum and the solve records
+    variables : list
+        reaction ids or variable names
+    processes : int
+        number of worker processes, the steps run in this process if 1
+    initializer : function
+        initializes the global state of the step function
+    initargs : tuple
+        arguments of the initializer
+    chunksize : int, optional
+        number of variables sent to a worker at a time, by default 1. Ignored
+        (one variable at a time) with a checkpoint log, results of a chunk only come
+        back once the whole chunk is solved.
+    log : VariabilityLog, optional
+        checkpoint log, by default None
+    callback : function, optional
+        called with every SolveRecord as the results come in, by default None
+
+    Returns
+    -------
+    tuple
+        dictionary of variable to (minimum, maximum) and the list of SolveRecord
+    """
+    ranges, records = ({}, [])
+
+    def collect(results):
+        for variable, minimum, maximum, step_records in results:
+            ranges[variable] = (minimum, maximum)
+            records.extend(step_records)
+            for record in step_records:
+                if record.time_limit:
+                    logger.warning(
+                        "{} of {} stopped at the time limit, the incumbent {} is not "
+                        "proven optimal".format(
+                            record.sense,
+                            variable,
+                            minimum if record.sense == "min" else maximum,
+                        )
+                    )
+                if callback is not None:
+                    callback(record)
+            if log is not None:
+                log.append(
+                    variable,
+                    minimum,
+                    maximum,
+                    step_records[0].status,
+                    step_records[1].status,
+                    sum(record.solve_time for record in step_records),
+                )
+
+    if log is not None:
+        chunksize = 1
+
+    if processes > 1:
+        with multiprocessing.Pool(
+            processes, initializer=initializer, initargs=initargs
+        ) as pool:
+            collect(pool.imap_unordered(step, variables, chunksize=chunksize))
+    else:
+        initializer(*initargs)
+        collect(map(step, variables))
 
-def variability(model_variability, variable_list=None):
+    return ranges, records
+
+
+def _ranges_dataframe(variables, ranges, statistics, records):
+    fluxes_min = np.array([ranges[variable][0] for variable in variables])
+    fluxes_max = np.array([ranges[variable][1] for variable in variables])
+
+    result = DataFrame(
+        {
+            "minimum": Series(index=variables, data=fluxes_min, dtype=float),
+            "maximum": Series(index=variables, data=fluxes_max, dtype=float),
+        }
+    )
+    result.attrs["statistics"] = statistics
+    result.attrs["solves"] = records
+    return result
+
+
+def solve_report(records, n_slowest=10):
+    """Summary of the solves of TVA runs per variable.
+
+    Finds the variables dominating the run time and the solves stopped at the time
+    limit.
+
+    Parameters
+    ----------
+    records : list
+        SolveRecord of the runs, for example the 'solves' entry of the DataFrame.attrs
+        returned by variability
+    n_slowest : int, optional
+        number of slowest variables to report, None reports all the variables, by
+        default 10
+
+    Returns
+    -------
+    pd.DataFrame
+        total solve time, number of solves, largest MIP gap, total node count, number of
+        time limits hit and the statuses of every variable, sorted by solve time
+    """
+    solves = DataFrame.from_records(list(records), columns=SolveRecord._fields)
+    report = (
+        solves.groupby("variable")
+        .agg(
+            solve_time=("solve_time", "sum"),
+            solves=("sense", "size"),
+            mip_gap=("mip_gap", "max"),
+            node_count=("node_count", "sum"),
+            time_limits=("time_limit", "sum"),
+            statuses=("status", lambda statuses: ", ".join(sorted(set(statuses)))),
+        )
+        .sort_values("solve_time", ascending=False)
+    )
+    logger.info(
+        "{} solves of {} variables in {:.2f} s, {} stopped at the time limit".format(
+            len(solves),
+            len(report),
+            solves["solve_time"].sum(),
+            int(solves["time_limit"].sum()),
+        )
+    )
+    if n_slowest is not None:
+        report = report.head(n_slowest)
+    return report
+
+
+def relaxation_bounds(model, variables, envelope=None):
+    """Solves the LP relaxation of the model for the min and max of every variable.
+
+    The indicator variables are continuous in the relaxation. LP relaxation solves are
+    much cheaper than the MILP ones and consecutive solves only change the objective,
+    so the solver reuses the previous basis. The relaxation bounds every MILP optimum,
+    relaxation solutions with integral indicators are feasible MILP solutions.
+
+    Parameters
+    ----------
+    model : multitfa.core.tmodel
+        multitfa model after thermodynamic constraints are added
+    variables : list
+        reaction ids or variable names
+    envelope : _Envelope, optional
+        envelope harvesting the integer feasible relaxation solutions, by default None
+
+    Returns
+    -------
+    dict
+        Dictionary of variable to (lp minimum, lp maximum), None if not solved to
+        optimality
+    """
+    reaction_variables = _reaction_variables(model)
+    indicators = _indicator_names(model)
+    indicator_variables = [model.variables[name] for name in indicators]
+    integrality = model.solver.configuration.tolerances.integrality
+    objective, direction = (model.objective, model.objective_direction)
+
+    bounds = {}
+    try:
+        for var in indicator_variables:
+            var.type = "continuous"
+        for variable in variables:
+            model.objective = model.problem.Objective(
+                sum(
+                    coefficient * model.variables[name]
+                    for name, coefficient in _objective_terms(
+                        reaction_variables, variable
+                    )
+                )
+            )
+            lp_bounds = []
+            for sense in ("min", "max"):
+                model.objective_direction = sense
+                model.slim_optimize()
+                if model.solver.status != "optimal":
+                    lp_bounds.append(None)
+                    continue
+                lp_bounds.append(model.objective.value)
+                primal_values = model.solver.primal_values
+                if envelope is not None and _is_integral(
+                    [primal_values[name] for name in indicators], integrality
+                ):
+                    envelope.harvest_primals(primal_values)
+            bounds[variable] = tuple(lp_bounds)
+    finally:
+        for var in indicator_variables:
+            var.type = "binary"
+        model.objective = objective
+        model.objective_direction = direction
+
+    return bounds
+
+
+def _init_worker(model, warm_start=False, lp_bounds=None, envelope=None):
+    """Initialize a global model object for multiprocessing.
+
+    With warm start, the indicator assignment of the last solve is kept to be used as
+    MIP start. With relaxation bounds, feasible primal solutions are harvested in the
+    (shared) envelope to skip solves whose bound is already attained.
+    """
+    global _model, _worker
+    _model = model
+    _worker = {
+        "indicators": _indicator_names(model) if warm_start else None,
+        "mip_start": None,
+        "lp_bounds": lp_bounds,
+        "envelope": envelope,
+    }
+
+
+def _set_mip_start(model, start):
+    """Sets a MIP start on the solver of the model.
+
+    Optlang has no interface for MIP starts, so they are passed to the Gurobi/Cplex
+    problem directly. Other solvers (e.g. GLPK) have no MIP start and are left
+    untouched.
+
+    Parameters
+    ----------
+    model : multitfa.core.tmodel
+        multitfa model
+    start : dict
+        Dictionary of variable name to start value
+    """
+    interface = model.solver.__class__.__module__
+    if interface == "optlang.gurobi_interface":
+        problem = model.solver.problem
+        for name, value in start.items():
+            problem.getVarByName(name).Start = value
+    elif interface == "optlang.cplex_interface":
+        from cplex import SparsePair
+
+        problem = model.solver.problem
+        problem.MIP_starts.delete()
+        problem.MIP_starts.add(
+            SparsePair(ind=list(start), val=list(start.values())),
+            problem.MIP_starts.effort_level.repair,
+        )
+
+
+def _optimize(model, direction):
+    """Optimizes the global model in the given direction.
+
+    With warm start, the MIP start of the worker is used and updated. Optimal solutions
+    are harvested in the envelope of the worker.
+
+    Parameters
+    ----------
+    model : multitfa.core.tmodel
+        multitfa model with the objective set
+    direction : str
+        'min' or 'max'
+
+    Returns
+    -------
+    float
+        objective value
+    """
+    if _worker["mip_start"]:
+        _set_mip_start(model, _worker["mip_start"])
+
+    model.objective_direction = direction
+    _ = model.slim_optimize()
+
+    if model.solver.status == "optimal":
+        if _worker["indicators"] is not None or _worker["envelope"] is not None:
+            primal_values = model.solver.primal_values
+        if _worker["indicators"] is not None:
+            _worker["mip_start"] = {
+                name: round(primal_values[name]) for name in _worker["indicators"]
+            }
+        if _worker["envelope"] is not None:
+            _worker["envelope"].harvest_primals(primal_values)
+    return model.objective.value
+
+
+def _attained(state, variable, i, direction, tolerance):
+    """Envelope value of a variable if it attains the relaxation bound, else None."""
+    if state["envelope"] is None:
+        return None
+    return state["envelope"].attained(
+        variable, direction, state["lp_bounds"][variable][i], tolerance
+    )
+
+
+def _variability_step(variable):
+    """Minimizes and maximizes a variable of the global model.
+
+    If the variable is a reaction id, the objective is forward - reverse variables of
+    the reaction. Solves whose relaxation bound is attained by a harvested feasible
+    solution are skipped.
+
+    Parameters
+    ----------
+    variable : str
+        reaction id or variable name
+
+    Returns
+    -------
+    tuple
+        variable, minimum, maximum and the SolveRecord of the min and max solves
+    """
+    if _model.reactions.has_id(variable):
+        rxn = _model.reactions.get_by_id(variable)
+        objective_exp = 1 * rxn.forward_variable - 1 * rxn.reverse_variable
+    else:
+        var = _model.solver.variables[variable]
+        objective_exp = 1 * var
+
+    objective_set, records, values = (False, [], [])
+    for i, direction in enumerate(("min", "max")):
+        start = time.perf_counter()
+        value = _attained(_worker, variable, i, direction, _model.tolerance)
+        if value is not None:
+            records.append(_solve_record(variable, direction, start, ATTAINED))
+        else:
+            if not objective_set:
+                _model.objective = objective_exp
+                objective_set = True
+            value = _optimize(_model, direction)
+            status = _model.solver.status
+            records.append(
+                _solve_record(
+                    variable,
+                    direction,
+                    start,
+                    status,
+                    time_limit=status == "time_limit",
+                    problem=_model.solver.problem,
+                )
+            )
+        values.append(value)
+
+    return variable, values[0], values[1], records
+
+
+def adjacency_order(model, variables):
+    """Orders variables so that variables of neighbouring reactions are adjacent.
+
+    Reactions are ordered by reverse Cuthill-McKee on the reaction adjacency (reactions
+    sharing a metabolite). Reaction variables (flux, dG_, indicator_) take the position
+    of their reaction and metabolite variables (lnc_, dG_err_) the position of the
+    first reaction of the metabolite, other variables are placed last. Consecutive
+    solves then share most of their active structure.
+
+    Parameters
+    ----------
+    model : multitfa.core.tmodel
+        multitfa model
+    variables : list
+        reaction ids or variable names
+
+    Returns
+    -------
+    list
+        reordered variables
+    """
+    S = abs(model.stoichiometric_matrix)
+    adjacency = sp.csr_matrix(S.T @ S)
+    reaction_rank = np.empty(len(model.reactions), dtype=int)
+    reaction_rank[reverse_cuthill_mckee(adjacency, symmetric_mode=True)] = np.arange(
+        len(model.reactions)
+    )
+
+    rank = {}
+    for i, rxn in enumerate(model.reactions):
+        for name in (rxn.forward_variable.name, rxn.reverse_variable.name):
+            for prefix in ("", "dG_", "indicator_"):
+                rank[prefix + name] = reaction_rank[i]
+        rank[rxn.id] = reaction_rank[i]
+    for metabolite in model.metabolites:
+        if metabolite.reactions:
+            metabolite_rank = min(
+                reaction_rank[model.reactions.index(rxn)]
+                for rxn in metabolite.reactions
+            )
+            rank["lnc_{}".format(metabolite.id)] = metabolite_rank
+            rank["dG_err_{}".format(metabolite.id)] = metabolite_rank
+
+    return sorted(variables, key=lambda variable: rank.get(variable, len(rank)))
+
+
+def variability(
+    model_variability,
+    variable_list=None,
+    processes=1,
+    warm_start=False,
+    prescreen=False,
+    checkpoint=None,
+    callback=None,
+):
     """Perform thermodynamic variability analysis.
 
     Determine the minimum and maximum values for the input variables (Flux, Gibbs free
@@ -17,7 +746,31 @@ def variability(model_variability, variable_list=None):
         multitfa model after thermodynamic constraints are added
     variable_list : List, optional
         List of variables to perform TVA on, by default None
-
+    processes : int, optional
+        The number of parallel processes to run. Variables are split in chunks and each
+        process solves its chunks on its own copy of the model, by default 1
+    warm_start : Bool, optional
+        If True, variables are solved in stoichiometric adjacency order (see
+        adjacency_order) and the indicator assignment of the last solve is used as MIP
+        start of the next one. MIP starts are only supported for Gurobi and Cplex, by
+        default False
+    prescreen : Bool, optional
+        If True, the LP relaxation is first solved for all variables (see
+        relaxation_bounds). Running min/max envelopes of all the requested variables are
+        kept over every feasible primal solution seen in the run, shared between
+        processes, and MILP solves whose relaxation bound is already attained by the
+        envelope are skipped. Solve statistics are stored in the 'statistics' entry of
+        DataFrame.attrs, by default False
+    checkpoint : str, pathlib.Path or VariabilityLog, optional
+        Append-only log of the completed variables (see VariabilityLog). Every variable
+        is logged as soon as it finishes, and variables already in the log are not
+        solved again, so an interrupted run can be resumed with the same checkpoint, by
+        default None
+    callback : function, optional
+        Called with the SolveRecord of every min and max solve as the results come in
+        (in the calling process), for example to monitor slow variables. All the records
+        are also stored in the 'solves' entry of DataFrame.attrs, see solve_report, by
+        default None
 
     Returns
     -------
@@ -27,7 +780,8 @@ def variability(model_variability, variable_list=None):
     Raises
     ------
     ValueError
-        If model is infeasible with initial constraints raises valueerror
+        If model is infeasible with initial constraints raises valueerror, or if the
+        checkpoint was written for another model (see VariabilityLog.validate)
     """
 
     model = copy(model_variability)
@@ -39,49 +793,541 @@ def variability(model_variability, variable_list=None):
     if np.isnan(model.slim_optimize()):
         raise ValueError("model infeasible with given constraints")
 
-    fluxes_min = np.empty(len(variables))
-    fluxes_max = np.empty(len(variables))
-    rxn_name = list()
+    log, resumed = _open_checkpoint(checkpoint, model)
+    pending = [variable for variable in variables if variable not in resumed]
+
+    processes = max(1, min(processes, len(pending)))
+
+    # Neighbouring solves share structure, chunks keep the order within a process
+    solve_order = adjacency_order(model, pending) if warm_start else pending
+
+    lp_bounds, envelope = (None, None)
+    if prescreen and pending:
+        envelope = _Envelope(pending, _reaction_variables(model))
+        # The solution of the feasibility check is a feasible solution too
+        envelope.harvest_primals(model.solver.primal_values)
+        lp_bounds = relaxation_bounds(model, pending, envelope)
+        if processes > 1:
+            envelope.share()
+
+    ranges, records = _run_steps(
+        _variability_step,
+        solve_order,
+        processes,
+        _init_worker,
+        (model, warm_start, lp_bounds, envelope),
+        chunksize=max(1, len(pending) // processes),
+        log=log,
+        callback=callback,
+    )
+
+    statistics = _statistics(
+        len(variables),
+        2 * len(lp_bounds) if lp_bounds is not None else 0,
+        records,
+        len(variables) - len(pending),
+    )
+    return _ranges_dataframe(variables, {**resumed, **ranges}, statistics, records)
+
+
+def _interface_to_mps(interface):
+    """Serializes a Gurobi/Cplex interface to MPS bytes.
+
+    The bytes can be sent to worker processes to rebuild the interface.
+
+    Parameters
+    ----------
+    interface : gurobipy.Model or cplex.Cplex
+        Gurobi/Cplex interface of the model
+
+    Returns
+    -------
+    bytes
+        MPS file content
+    """
+    with tempfile.TemporaryDirectory() as td:
+        temp_filename = os.path.join(td, "model.mps")
+        interface.write(temp_filename)
+        with open(temp_filename, "rb") as handle:
+            return handle.read()
+
+
+def _interface_from_mps(solver, mps_bytes):
+    """Rebuilds a Gurobi/Cplex interface from MPS bytes, see _interface_to_mps.
+
+    Solver output is switched off.
+
+    Parameters
+    ----------
+    solver : str
+        'gurobi' or 'cplex'
+    mps_bytes : bytes
+        MPS file content
 
-    rxn_ids = [rxn.id for rxn in model.reactions]
+    Returns
+    -------
+    gurobipy.Model or cplex.Cplex
+        private copy of the interface
+    """
+    with tempfile.TemporaryDirectory() as td:
+        temp_filename = os.path.join(td, "model.mps")
+        with open(temp_filename, "wb") as handle:
+            handle.write(mps_bytes)
 
-    for i in range(len(variables)):
-        # For reaction flux, objective is forward - reverse variables
-        if variables[i] in rxn_ids:
-            rxn = model.reactions.get_by_id(variables[i])
-            objective_exp = 1 * rxn.forward_variable - 1 * rxn.reverse_variable
+        if solver == "gurobi":
+            import gurobipy
+
+            interface = gurobipy.read(temp_filename)
+            interface.Params.OutputFlag = 0
         else:
-            var = model.solver.variables[variables[i]]
-            objective_exp = 1 * var
+            from cplex import Cplex
 
-        rxn_name.append(variables[i])
-        model.objective = objective_exp
+            interface = Cplex()
+            interface.set_log_stream(None)
+            interface.set_error_stream(None)
+            interface.set_warning_stream(None)
+            interface.set_results_stream(None)
+            interface.read(temp_filename)
+    return interface
 
-        # minimization
-        model.objective_direction = "min"
-        _ = model.slim_optimize()
-        objective_value = model.objective.value
-        fluxes_min[i] = objective_value
 
-        # maximiztion
-        model.objective_direction = "max"
-        _ = model.slim_optimize()
-        objective_value = model.objective.value
-        fluxes_max[i] = objective_value
+def _legacy_relaxation_bounds(
+    solver, interface, variables, reaction_variables, indicators, envelope
+):
+    """Solves the continuous relaxation of a Gurobi/Cplex interface for every variable.
 
-    return DataFrame(
-        {
-            "minimum": Series(index=rxn_name, data=fluxes_min),
-            "maximum": Series(index=rxn_name, data=fluxes_max),
-        }
+    The relaxation is a QCP with continuous indicator variables, solved for the min and
+    max of every variable. Relaxation solutions with integral indicators are harvested
+    in the envelope.
+
+    Parameters
+    ----------
+    solver : str
+        'gurobi' or 'cplex'
+    interface : gurobipy.Model or cplex.Cplex
+        Gurobi/Cplex interface of the model, left unchanged
+    variables : list
+        reaction ids or variable names
+    reaction_variables : dict
+        Dictionary of reaction id to names of the forward and reverse variables
+    indicators : list
+        names of the indicator variables
+    envelope : _Envelope
+        envelope of the run
+
+    Returns
+    -------
+    dict
+        Dictionary of variable to (relaxation minimum, relaxation maximum), None if not
+        solved to optimality
+    """
+    bounds = {}
+    if solver == "gurobi":
+        from gurobipy import GRB, LinExpr
+
+        interface.update()
+        relaxed = interface.relax()
+        relaxed.Params.OutputFlag = 0
+        indicator_vars = [relaxed.getVarByName(name) for name in indicators]
+        envelope_vars = [relaxed.getVarByName(name) for name in envelope.names]
+        for variable in variables:
+            terms = _objective_terms(reaction_variables, variable)
+            obj_exp = LinExpr(
+                [coefficient for _, coefficient in terms],
+                [relaxed.getVarByName(name) for name, _ in terms],
+            )
+            relaxation = []
+            for sense in (GRB.MINIMIZE, GRB.MAXIMIZE):
+                relaxed.setObjective(obj_exp, sense)
+                relaxed.optimize()
+                if relaxed.Status != GRB.OPTIMAL:
+                    relaxation.append(None)
+                    continue
+                relaxation.append(relaxed.ObjVal)
+                if _is_integral(
+                    relaxed.getAttr("X", indicator_vars), relaxed.Params.IntFeasTol
+                ):
+                    envelope.harvest(relaxed.getAttr("X", envelope_vars))
+            bounds[variable] = tuple(relaxation)
+    else:
+        relaxed = _interface_from_mps(solver, _interface_to_mps(interface))
+        names = relaxed.variables.get_names()
+        relaxed.variables.set_types(
+            [(name, relaxed.variables.type.continuous) for name in indicators]
+        )
+        # Without integer variables left, the problem is still typed as a MIP
+        relaxed.set_problem_type(
+            relaxed.problem_type.QCP
+            if relaxed.quadratic_constraints.get_num() > 0
+            else relaxed.problem_type.LP
+        )
+        relaxed.objective.set_linear([(name, 0) for name in names])
+        tolerance = relaxed.parameters.mip.tolerances.integrality.get()
+        previous = []
+        for variable in variables:
+            if previous:
+                relaxed.objective.set_linear([(name, 0) for name, _ in previous])
+            previous = _objective_terms(reaction_variables, variable)
+            relaxed.objective.set_linear(previous)
+            relaxation = []
+            for sense in (
+                relaxed.objective.sense.minimize,
+                relaxed.objective.sense.maximize,
+            ):
+                relaxed.objective.set_sense(sense)
+                relaxed.solve()
+                if relaxed.solution.get_status() != relaxed.solution.status.optimal:
+                    relaxation.append(None)
+                    continue
+                relaxation.append(relaxed.solution.get_objective_value())
+                if _is_integral(relaxed.solution.get_values(indicators), tolerance):
+                    envelope.harvest(relaxed.solution.get_values(envelope.names))
+            bounds[variable] = tuple(relaxation)
+    return bounds
+
+
+def _init_legacy_worker(
+    solver,
+    interface,
+    reaction_variables,
+    indicators,
+    warm_start,
+    params,
+    threads,
+    lp_bounds=None,
+    envelope=None,
+):
+    """Initialize a global Gurobi/Cplex interface for the legacy variability analysis.
+
+    In worker processes the interface is rebuilt from MPS bytes.
+
+    Parameters
+    ----------
+    solver : str
+        'gurobi' or 'cplex'
+    interface : gurobipy.Model, cplex.Cplex or bytes
+        private copy of the interface or its MPS bytes
+    reaction_variables : dict
+        Dictionary of reaction id to names of the forward and reverse variables
+    indicators : list
+        names of the indicator variables
+    warm_start : dict
+        variable name and initial solution, only used by Gurobi
+    params : Bool
+        If True sets the time limit options, see variability_legacy_gurobi/cplex
+    threads : int or None
+        number of solver threads, None keeps the solver default
+    lp_bounds : dict, optional
+        relaxation bounds of the variables, by default None
+    envelope : _Envelope, optional
+        (shared) envelope of the feasible solutions, by default None
+    """
+    global _legacy
+    if isinstance(interface, bytes):
+        interface = _interface_from_mps(solver, interface)
+
+    envelope_vars, indicator_vars = (None, None)
+    if solver == "gurobi":
+        # Set the time limit searching for solution, useful for pathological variables
+        # taking long time
+        if params:
+            interface.Params.TimeLimit = 300
+        if threads is not None:
+            interface.Params.Threads = threads
+        interface.update()
+        indicator_vars = [interface.getVarByName(name) for name in indicators]
+        if envelope is not None:
+            envelope_vars = [interface.getVarByName(name) for name in envelope.names]
+    else:
+        if params:
+            interface.parameters.mip.tolerances.mipgap = 0.005
+            interface.parameters.timelimit = 300
+            interface.parameters.mip.limits.probetime = 300
+        if threads is not None:
+            interface.parameters.threads.set(threads)
+        # Clear the model objective, each step sets its own
+        interface.objective.set_linear(
+            [(name, 0) for name in interface.variables.get_names()]
+        )
+
+    _legacy = {
+        "solver": solver,
+        "interface": interface,
+        "reaction_variables": reaction_variables,
+        "indicators": indicators,
+        "indicator_vars": indicator_vars,
+        "warm_start": dict(warm_start),
+        "objective": [],
+        "lp_bounds": lp_bounds,
+        "envelope": envelope,
+        "envelope_vars": envelope_vars,
+    }
+
+
+def _gurobi_variability_step(variable):
+    """Minimizes and maximizes a variable on the global Gurobi interface.
+
+    The indicator values of the minimization are used as MIP start of the maximization
+    and of the next minimization. Feasible solutions are harvested in the envelope and
+    solves whose relaxation bound is attained are skipped.
+
+    Parameters
+    ----------
+    variable : str
+        reaction id or variable name
+
+    Returns
+    -------
+    tuple
+        variable, minimum, maximum and the SolveRecord of the min and max solves
+    """
+    from gurobipy import GRB, LinExpr
+
+    gurobi_interface = _legacy["interface"]
+    terms = _objective_terms(_legacy["reaction_variables"], variable)
+    obj_exp = LinExpr(
+        [coefficient for _, coefficient in terms],
+        [gurobi_interface.getVarByName(name) for name, _ in terms],
+    )
+
+    records, values = ([], [])
+    for i, direction in enumerate(("min", "max")):
+        start = time.perf_counter()
+        value = _attained(
+            _legacy, variable, i, direction, gurobi_interface.Params.FeasibilityTol
+        )
+        if value is not None:
+            records.append(_solve_record(variable, direction, start, ATTAINED))
+            values.append(value)
+            continue
+
+        for name, start_value in _legacy["warm_start"].items():
+            gurobi_interface.getVarByName(name).Start = start_value
+
+        gurobi_interface.setObjective(
+            obj_exp, GRB.MINIMIZE if direction == "min" else GRB.MAXIMIZE
+        )
+        gurobi_interface.update()
+        gurobi_interface.optimize()
+        records.append(
+            _solve_record(
+                variable,
+                direction,
+                start,
+                _GUROBI_STATUS.get(gurobi_interface.Status, "unknown"),
+                time_limit=gurobi_interface.Status == GRB.TIME_LIMIT,
+                problem=gurobi_interface,
+            )
+        )
+        values.append(
+            gurobi_interface.ObjVal if gurobi_interface.SolCount > 0 else np.nan
+        )
+
+        if gurobi_interface.SolCount > 0:
+            if direction == "min":
+                _legacy["warm_start"] = dict(
+                    zip(
+                        _legacy["indicators"],
+                        gurobi_interface.getAttr("X", _legacy["indicator_vars"]),
+                    )
+                )
+            if _legacy["envelope"] is not None:
+                _legacy["envelope"].harvest(
+                    gurobi_interface.getAttr("X", _legacy["envelope_vars"])
+                )
+
+    return variable, values[0], values[1], records
+
+
+def _cplex_variability_step(variable):
+    """Minimizes and maximizes a variable on the global Cplex interface.
+
+    Feasible solutions are harvested in the envelope and solves whose relaxation bound
+    is attained are skipped.
+
+    Parameters
+    ----------
+    variable : str
+        reaction id or variable name
+
+    Returns
+    -------
+    tuple
+        variable, minimum, maximum and the SolveRecord of the min and max solves
+    """
+    cplex_model = _legacy["interface"]
+
+    # Reset the objective of the previous step
+    if _legacy["objective"]:
+        cplex_model.objective.set_linear(
+            [(name, 0) for name, _ in _legacy["objective"]]
+        )
+    _legacy["objective"] = _objective_terms(_legacy["reaction_variables"], variable)
+    cplex_model.objective.set_linear(_legacy["objective"])
+
+    senses = {
+        "min": cplex_model.objective.sense.minimize,
+        "max": cplex_model.objective.sense.maximize,
+    }
+    tolerance = cplex_model.parameters.simplex.tolerances.feasibility.get()
+
+    records, values = ([], [])
+    for i, direction in enumerate(("min", "max")):
+        start = time.perf_counter()
+        value = _attained(_legacy, variable, i, direction, tolerance)
+        if value is not None:
+            records.append(_solve_record(variable, direction, start, ATTAINED))
+            values.append(value)
+            continue
+
+        cplex_model.objective.set_sense(senses[direction])
+        cplex_model.solve()
+        records.append(
+            _solve_record(
+                variable,
+                direction,
+                start,
+                cplex_model.solution.get_status_string(),
+                time_limit=_cplex_time_limit(cplex_model),
+                problem=cplex_model,
+            )
+        )
+        values.append(
+            cplex_model.solution.get_objective_value()
+            if cplex_model.solution.is_primal_feasible()
+            else np.nan
+        )
+
+        if (
+            _legacy["envelope"] is not None
+            and cplex_model.solution.is_primal_feasible()
+        ):
+            _legacy["envelope"].harvest(
+                cplex_model.solution.get_values(_legacy["envelope"].names)
+            )
+
+    return variable, values[0], values[1], records
+
+
+def _legacy_variability(
+    solver,
+    interface,
+    model,
+    variables,
+    warm_start,
+    params,
+    processes,
+    threads,
+    prescreen,
+    checkpoint,
+    callback,
+):
+    """Runs the legacy variability analysis serially or on a pool of worker processes.
+
+    Each worker holds its own copy of the interface, rebuilt from MPS bytes, and takes
+    the variables one at a time from the pool's task queue, results are streamed back as
+    they finish.
+
+    Parameters
+    ----------
+    solver : str
+        'gurobi' or 'cplex'
+    interface : gurobipy.Model or cplex.Cplex
+        Gurobi/Cplex interface of the model, left unchanged
+    model : multitfa.core.tmodel
+        multitfa model after thermodynamic constraints are added
+    variables : list
+        reaction ids or variable names
+    warm_start : dict
+        variable name and initial solution, only used by Gurobi
+    params : Bool
+        If True sets the time limit options
+    processes : int
+        number of worker processes
+    threads : int or None
+        solver threads per worker process, by default cpu count / processes when running
+        in parallel
+    prescreen : Bool
+        If True, solves the continuous relaxation first and skips solves attained by the
+        envelope of the feasible solutions
+    checkpoint : str, pathlib.Path, VariabilityLog or None
+        log of the completed variables, logged variables are not solved again
+    callback : function or None
+        called with the SolveRecord of every solve
+
+    Returns
+    -------
+    pd.DataFrame
+        Dataframe of min max ranges of variables
+    """
+    reaction_variables = _reaction_variables(model)
+    indicators = _indicator_names(model)
+    step = _gurobi_variability_step if solver == "gurobi" else _cplex_variability_step
+
+    log, resumed = _open_checkpoint(checkpoint, model, solver=solver, params=params)
+    pending = [variable for variable in variables if variable not in resumed]
+
+    lp_bounds, envelope = (None, None)
+    if prescreen and pending:
+        envelope = _Envelope(pending, reaction_variables)
+        lp_bounds = _legacy_relaxation_bounds(
+            solver, interface, pending, reaction_variables, indicators, envelope
+        )
+
+    processes = max(1, min(processes, len(pending)))
+    if processes > 1:
+        if threads is None:
+            threads = max(1, multiprocessing.cpu_count() // processes)
+        if solver == "gurobi":
+            interface.update()
+        if envelope is not None:
+            envelope.share()
+        interface = _interface_to_mps(interface)
+    elif solver == "gurobi":
+        # Instead of copying the whole model, just copy the solver object
+        interface = interface.copy()
+    else:
+        interface = _interface_from_mps(solver, _interface_to_mps(interface))
+
+    ranges, records = _run_steps(
+        step,
+        pending,
+        processes,
+        _init_legacy_worker,
+        (
+            solver,
+            interface,
+            reaction_variables,
+            indicators,
+            warm_start,
+            params,
+            threads,
+            lp_bounds,
+            envelope,
+        ),
+        log=log,
+        callback=callback,
     )
 
+    statistics = _statistics(
+        len(variables),
+        2 * len(lp_bounds) if lp_bounds is not None else 0,
+        records,
+        len(variables) - len(pending),
+    )
+    return _ranges_dataframe(variables, {**resumed, **ranges}, statistics, records)
+
 
 def variability_legacy_gurobi(
     model_variability,
     variable_list=None,
     warm_start={},
     params=False,
+    processes=1,
+    threads=None,
+    prescreen=False,
+    checkpoint=None,
+    callback=None,
 ):
     """Custom function to perform TVA on MIQC problem using gurobi.
 
@@ -95,95 +1341,71 @@ def variability_legacy_gurobi(
         Optionally can specify warm start to speed up problem. variable name and initial solution, by default {}
     params : Bool, optional
         If True sets the Timelimit option to 300 sec
+    processes : int, optional
+        The number of parallel processes to run, each with its own copy of the gurobi
+        interface, by default 1
+    threads : int, optional
+        Number of gurobi threads of each process, by default cpu count / processes when
+        running in parallel and gurobi's default otherwise
+    prescreen : Bool, optional
+        If True, the continuous relaxation is first solved for all variables. Running
+        min/max envelopes of the requested variables are kept over every feasible
+        solution seen in the run and solves whose relaxation bound is attained are
+        skipped, by default False
+    checkpoint : str, pathlib.Path or VariabilityLog, optional
+        Append-only log of the completed variables (see VariabilityLog). Every variable
+        is logged as soon as it finishes, and variables already in the log are not
+        solved again, so an interrupted run can be resumed with the same checkpoint, by
+        default None
+    callback : function, optional
+        Called with the SolveRecord of every min and max solve as the results come in
+        (in the calling process), for example to monitor slow variables. All the records
+        are also stored in the 'solves' entry of DataFrame.attrs, see solve_report, by
+        default None
 
     Returns
     -------
     pd.DataFrame
         Dataframe of min max ranges of variables
     """
-    from gurobipy import GRB
-
-    gurobi_interface = model_variability.gurobi_interface.copy()
+    gurobi_interface = model_variability.gurobi_interface
 
     if variable_list == None:
-        variables = gurobi_interface.getVars()
+        variables = [var.VarName for var in gurobi_interface.getVars()]
     else:
         variables = [var for var in variable_list]
 
-    gurobi_interface.optimize()
-
-    # Set the time limit searching for solution, useful for pathlogical variables taking long time
-    if params:
-        gurobi_interface.params.TimeLimit = 300
-
-    fluxes_min = np.empty(len(variables))
-    fluxes_max = np.empty(len(variables))
-    rxn_name = list()
-
-    rxn_ids = [rxn.id for rxn in model_variability.reactions]
-
-    for i in range(len(variables)):
-        # if the variable is reactions optimize for forward - reverse variables else optimize for the variable
-        if variables[i] in rxn_ids:
-            rxn = model_variability.reactions.get_by_id(variables[i])
-            for_var = gurobi_interface.getVarByName(rxn.forward_variable.name)
-            rev_var = gurobi_interface.getVarByName(rxn.reverse_variable.name)
-            obj_exp = for_var - rev_var
-        else:
-            obj_exp = gurobi_interface.getVarByName(variables[i])
-
-        rxn_name.append(variables[i])
-
-        # minimization
-        if len(warm_start) != 0:
-            for var in gurobi_interface.getVars():
-                if var in warm_start:
-                    var.Start = warm_start[var]
-
-        gurobi_interface.setObjective(obj_exp, GRB.MINIMIZE)
-        gurobi_interface.update()
-        gurobi_interface.optimize()
-        objective_value = gurobi_interface.ObjVal
-        fluxes_min[i] = objective_value
-        # print(rxn.id, "min", objective_value)
-
-        warm_start = {}
-        for var in gurobi_interface.getVars():
-            if var.VarName.startswith("indicator_"):
-                warm_start[var] = var.x
+    # Warm start by variable name, so it can be sent to the worker processes
+    warm_start = {
+        getattr(var, "VarName", var): value for var, value in warm_start.items()
+    }
 
-        # maximiztion
-        for var in gurobi_interface.getVars():
-            if var in warm_start:
-                var.Start = warm_start[var]
-
-        gurobi_interface.setObjective(obj_exp, GRB.MAXIMIZE)
-        gurobi_interface.update()
-        gurobi_interface.optimize()
-        objective_value = gurobi_interface.ObjVal
-        fluxes_max[i] = objective_value
-        # print(rxn.id, "max", objective_value)
-
-    return DataFrame(
-        {
-            "minimum": Series(index=rxn_name, data=fluxes_min),
-            "maximum": Series(index=rxn_name, data=fluxes_max),
-        }
+    return _legacy_variability(
+        "gurobi",
+        gurobi_interface,
+        model_variability,
+        variables,
+        warm_start,
+        params,
+        processes,
+        threads,
+        prescreen,
+        checkpoint,
+        callback,
     )
 
 
-import os
-import string
-import tempfile
-from random import choices
-
-
 def variability_legacy_cplex(
     model,
     variable_list=None,
     params=False,
+    processes=1,
+    threads=None,
+    prescreen=False,
+    checkpoint=None,
+    callback=None,
 ):
-    """Custom function to perform TVA on MIQC problem using gurobi.
+    """Custom function to perform TVA on MIQC problem using cplex.
 
     Parameters
     ----------
@@ -193,100 +1415,48 @@ def variability_legacy_cplex(
         List of variables to perform TVA on, by default None
     params : Bool, optional
         If True sets the Timelimit option to 300 sec and reduced the mip gap to 0.005
+    processes : int, optional
+        The number of parallel processes to run, each with its own copy of the cplex
+        interface, by default 1
+    threads : int, optional
+        Number of cplex threads of each process, by default cpu count / processes when
+        running in parallel and cplex's default otherwise
+    prescreen : Bool, optional
+        If True, the continuous relaxation is first solved for all variables. Running
+        min/max envelopes of the requested variables are kept over every feasible
+        solution seen in the run and solves whose relaxation bound is attained are
+        skipped, by default False
+    checkpoint : str, pathlib.Path or VariabilityLog, optional
+        Append-only log of the completed variables (see VariabilityLog). Every variable
+        is logged as soon as it finishes, and variables already in the log are not
+        solved again, so an interrupted run can be resumed with the same checkpoint, by
+        default None
+    callback : function, optional
+        Called with the SolveRecord of every min and max solve as the results come in
+        (in the calling process), for example to monitor slow variables. All the records
+        are also stored in the 'solves' entry of DataFrame.attrs, see solve_report, by
+        default None
 
     Returns
     -------
     pd.DataFrame
         Dataframe of min max ranges of variables
-
-    Raises
-    ------
-    ValueError
-        [description]
     """
-    # Instead of copying the whole model, just copy the cplex solver object by writing to a file and reading again.
-    from cplex import Cplex, SparsePair
-
-    tmp_dir = (
-        os.path.normpath(os.path.dirname(os.path.abspath(__file__)))
-        + os.sep
-        + os.pardir
-        + os.sep
-        + "tmp"
-    )
-    if not os.path.exists(tmp_dir):
-        os.makedirs(tmp_dir)
-
-    # Instantiate Cplex model
-    cplex_model = Cplex()
-    rand_str = "".join(choices(string.ascii_lowercase + string.digits, k=6))
-
-    # write cplex model to mps file and re read
-    with tempfile.TemporaryDirectory() as td:
-        temp_filename = os.path.join(td, rand_str + ".mps")
-        model.cplex_interface.write(temp_filename)
-        cplex_model.read(temp_filename)
-
-    cplex_model.set_log_stream(None)
-    cplex_model.set_error_stream(None)
-    cplex_model.set_warning_stream(None)
-    cplex_model.set_results_stream(None)
-
-    if params:
-        # print("lol")
-        cplex_model.parameters.mip.tolerances.mipgap = 0.005
-        cplex_model.parameters.timelimit = 300
-        cplex_model.parameters.mip.limits.probetime = 300
-
-    # Make shorts for sense
-    max_sense = cplex_model.objective.sense.maximize
-    min_sense = cplex_model.objective.sense.minimize
-
     if variable_list == None:
         variables = model.cplex_interface.variables.get_names()
     else:
         variables = [var for var in variable_list]
 
-    vars_list_cplex = cplex_model.variables.get_names()
-
-    fluxes_min = np.empty(len(variables))
-    fluxes_max = np.empty(len(variables))
-    rxn_name = list()
-
-    rxn_ids = [rxn.id for rxn in model.reactions]
-
-    for i in range(len(variables)):
-        # Reset objective vector for each iteration
-        for varname in vars_list_cplex:
-            cplex_model.objective.set_linear(varname, 0)
-
-        # if the variable is reactions optimize for forward - reverse variables else optimize for the variable
-        if variables[i] in rxn_ids:
-            rxn = model.reactions.get_by_id(variables[i])
-            cplex_model.objective.set_linear(
-                [(rxn.forward_variable.name, 1), (rxn.reverse_variable.name, -1)]
-            )
-
-        else:
-            cplex_model.objective.set_linear(variables[i], 1)
-
-        rxn_name.append(variables[i])
-
-        # minimization
-        cplex_model.objective.set_sense(min_sense)
-        cplex_model.solve()
-        objective_value = cplex_model.solution.get_objective_value()
-        fluxes_min[i] = objective_value
-
-        # maximiztion
-        cplex_model.objective.set_sense(max_sense)
-        cplex_model.solve()
-        objective_value = cplex_model.solution.get_objective_value()
-        fluxes_max[i] = objective_value
-
-    return DataFrame(
-        {
-            "minimum": Series(index=rxn_name, data=fluxes_min),
-            "maximum": Series(index=rxn_name, data=fluxes_max),
-        }
+    return _legacy_variability(
+        "cplex",
+        model.cplex_interface,
+        model,
+        variables,
+        {},
+        params,
+        processes,
+        threads,
+        prescreen,
+        checkpoint,
+        callback,
     )
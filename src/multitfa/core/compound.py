@@ -154,8 +154,15 @@ class Thermo_met(Metabolite):
 
     @Kegg_id.setter
     def Kegg_id(self, value):
+        changed = value != getattr(self, "_Kegg_id", value)
         self._Kegg_id = value
-        # self._equilibrator_accession = api.get_compound(self.Kegg_id)
+        # Metabolites already resolved against equilibrator are updated in place
+        if (
+            changed
+            and self.model is not None
+            and hasattr(self.model, "_metabolite_equilibrator_accessions")
+        ):
+            self.model._update_metabolite_identifier(self)
 
     @property
     def delG_err_variable(self):
@@ -218,7 +225,9 @@ class Thermo_met(Metabolite):
         try:
             return self._std_dev
         except AttributeError:
-            variance = self.compound_vector @ covariance @ self.compound_vector.T
+            variance = (
+                self.compound_vector @ get_cc_data().covariance @ self.compound_vector.T
+            )
             self._std_dev = np.sqrt(variance[0][0])
             return self._std_dev
 
@@ -317,7 +326,11 @@ class Thermo_met(Metabolite):
         return min_ms
 
     def get_compound_vector(self):
-        """This is the implementation of compound vector from component contribution. Checks if the compound is covered by group contribution, reactant contribution or neither
+        """This is the implementation of compound vector from component contribution.
+
+        Checks if the compound is covered by group contribution, reactant contribution
+        or neither. Uses the compound vector persisted in the model's compound store
+        when available.
 
         Returns:
             comp_vector  np.array or None
@@ -325,26 +338,10 @@ class Thermo_met(Metabolite):
 
         """
         if self.equilibrator_accession:
-            try:
-                rc_index = rc_compound_ids.index(self.equilibrator_accession.id)
-                comp_vector = np.zeros(Nc + Ng, dtype=float)
-                comp_vector[rc_index] = 1
-                return comp_vector[np.newaxis, :]
-            except ValueError:
-                if self.equilibrator_accession.group_vector:
-                    comp_vector = np.hstack(
-                        [
-                            np.zeros(Nc, dtype=float),
-                            self.equilibrator_accession.group_vector,
-                        ]
-                    )
-                    return comp_vector[np.newaxis, :]
-                else:
-                    comp_vector = np.zeros(Nc + Ng, dtype=float)
-                    return comp_vector[np.newaxis, :]
-        else:
-            comp_vector = np.zeros(Nc + Ng, dtype=float)
-            return comp_vector[np.newaxis, :]
+            record = self.model.compound_records.get(self.Kegg_id)
+            if record is not None and record.compound_vector is not None:
+                return record.compound_vector[np.newaxis, :]
+        return compound_vector(self.equilibrator_accession)[np.newaxis, :]
 
     def calculate_delG_f(self):
         """Calculates the standard transformed Gibbs formation energy of compound using component contribution method. pH, Ionic strength values are taken from model's compartment_info attribute
@@ -353,7 +350,7 @@ class Thermo_met(Metabolite):
             float -- Transformed Gibbs energy of formation adjusted to pH, ionic strength of metabolite
         """
 
-        std_dG_f = self.compound_vector @ mu
+        std_dG_f = self.compound_vector @ get_cc_data().mu
         if self.compound_vector.any():
             transform = self.equilibrator_accession.transform(
                 p_h=Q_(self.model.compartment_info["pH"][self.compartment]),
@@ -365,3 +362,33 @@ class Thermo_met(Metabolite):
             return std_dG_f[0] + transform.to_base_units().magnitude * 1e-3
         else:
             return std_dG_f[0]
+
+
+def compound_vector(compound):
+    """Component contribution decomposition vector of an equilibrator compound.
+
+    If the compound is in the reactant contribution training data, the vector picks the
+    compound, otherwise its group vector is used. Compounds covered by neither have a
+    zero vector.
+
+    Parameters
+    ----------
+    compound : equilibrator_cache.Compound or None
+        equilibrator compound object
+
+    Returns
+    -------
+    np.ndarray
+        compound vector of length Nc + Ng
+    """
+    cc_data = get_cc_data()
+    comp_vector = np.zeros(cc_data.Nc + cc_data.Ng, dtype=float)
+    if not compound:
+        return comp_vector
+    try:
+        rc_index = cc_data.rc_compound_ids.index(compound.id)
+        comp_vector[rc_index] = 1
+    except ValueError:
+        if compound.group_vector:
+            comp_vector[cc_data.Nc :] = compound.group_vector
+    return comp_vector
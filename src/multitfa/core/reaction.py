@@ -2,7 +2,7 @@ from copy import copy
 
 import numpy as np
 from cobra import Reaction
-from numpy import zeros
+from cobra.util.context import resettable
 from six import iteritems
 
 from ..util.thermo_constants import FARADAY
@@ -208,8 +208,11 @@ class thermo_reaction(Reaction):
             return self._delG_prime
 
     @delG_prime.setter
+    @resettable
     def delG_prime(self, value):
-        self._delG_prime = value  # Update the value in model constraints
+        self._delG_prime = value
+        if self.model is not None:
+            self.model.patch_delG_constraints([self])
 
     @property
     def delG_transport(self):
@@ -227,8 +230,11 @@ class thermo_reaction(Reaction):
             return self._delG_transport
 
     @delG_transport.setter
+    @resettable
     def delG_transport(self, value):
-        self._delG_transport = value  # Update the consraints
+        self._delG_transport = value
+        if self.model is not None:
+            self.model.patch_delG_constraints([self])
 
     def calculate_transport_charge(self):
         """calculates the net charge and protons transported across the membrane. Net charge and protons transported for each compartment should be same. This function assumes that transport reactions involve only two compartments. Any reaction involving more than 2 compartments are not necessarily true transport reactions like biomass or lumped reaction, which are not really useful for transport considerations.
@@ -294,17 +300,23 @@ class thermo_reaction(Reaction):
             return electro_static_delG + proton_potential_adjustment
 
     def cal_stoichiometric_matrix(self):
-        """stoichiometric vector of forward reaction. Vector has length of number of metabolites in the model.
+        """stoichiometric vector of forward reaction.
+
+        Vector has length of number of metabolites in the model. Read from the model's
+        cached sparse stoichiometric matrix.
 
         Returns
         -------
         np.ndarray
             numpy vector of reaction stoichiometry
         """
-        S_matrix = zeros((len(self.model.metabolites)))
-        for metabolite, stoic in iteritems(self.metabolites):
-            S_matrix[self.model.metabolites.index(metabolite)] = stoic
-        return S_matrix
+        rxn_index = self.model.reactions.index(self)
+        return self.model.stoichiometric_matrix[:, rxn_index].toarray().ravel()
+
+    def add_metabolites(self, *args, **kwargs):
+        super().add_metabolites(*args, **kwargs)
+        if self.model is not None:
+            self.model._reset_stoichiometry()
 
     def get_coefficient(self, metabolite_id):
         _id_to_metabolites = {m.id: m for m in self.metabolites}
@@ -0,0 +1,172 @@
+import numpy as np
+from optlang.interface import Constraint, Variable
+
+
+#: Kinds of thermodynamic variables and their name prefixes, 'dG_err_' is before 'dG_'
+VARIABLE_KINDS = (
+    ("concentration", "lnc_"),
+    ("error", "dG_err_"),
+    ("delG", "dG_"),
+    ("indicator", "indicator_"),
+    ("component", "component_"),
+    ("sphere_small", "Sphere_s_"),
+    ("sphere_large", "Sphere_l_"),
+)
+
+
+def variable_kind(name):
+    """Kind of a thermodynamic variable from its name.
+
+    Parameters
+    ----------
+    name : str
+        variable name
+
+    Returns
+    -------
+    str or None
+        kind of the variable (see VARIABLE_KINDS), None if it isn't a thermodynamic
+        variable
+    """
+    for kind, prefix in VARIABLE_KINDS:
+        if name.startswith(prefix):
+            return kind
+    return None
+
+
+class VariableRegistry:
+    """Registry of the thermodynamic variables of a solver by kind.
+
+    The variable names of every kind are kept in the order they were added, tmodel
+    updates the registry as variables are added and removed, so looking up the variables
+    of a kind doesn't scan all the variables of the model. The array of variables of a
+    kind is built on first access and reused until the kind changes.
+
+    Parameters
+    ----------
+    solver : optlang.interface.Model
+        solver whose variables are registered, its current variables are registered on
+        creation
+    """
+
+    def __init__(self, solver):
+        self.solver = solver
+        self._names = {kind: {} for kind, _ in VARIABLE_KINDS}
+        self._arrays = {}
+        self.add(solver.variables)
+
+    def __getstate__(self):
+        """Get state for serialization.
+
+        The variable arrays are dropped, variables pickled on their own lose their
+        solver.
+        """
+        state = self.__dict__.copy()
+        state["_arrays"] = {}
+        return state
+
+    def __repr__(self):
+        return "<VariableRegistry {}>".format(
+            ", ".join(
+                "{}: {}".format(kind, len(names)) for kind, names in self._names.items()
+            )
+        )
+
+    def __getitem__(self, kind):
+        return self.variables(kind)
+
+    def __len__(self):
+        return sum(len(names) for names in self._names.values())
+
+    def add(self, variables):
+        """Registers the thermodynamic variables among variables.
+
+        Other variables and constraints are ignored.
+
+        Parameters
+        ----------
+        variables : iterable
+            optlang variables and constraints, or a single one
+        """
+        if isinstance(variables, (Variable, Constraint)):
+            variables = [variables]
+        for var in variables:
+            if not isinstance(var, Variable):
+                continue
+            kind = variable_kind(var.name)
+            if kind is not None:
+                self._names[kind][var.name] = None
+                self._arrays.pop(kind, None)
+
+    def remove(self, variables):
+        """Unregisters variables.
+
+        Parameters
+        ----------
+        variables : iterable
+            optlang variables and constraints or their names, or a single one
+        """
+        if isinstance(variables, (Variable, Constraint, str)):
+            variables = [variables]
+        for var in variables:
+            name = getattr(var, "name", var)
+            kind = variable_kind(name)
+            if kind is not None and name in self._names[kind]:
+                del self._names[kind][name]
+                self._arrays.pop(kind, None)
+
+    def names(self, kind):
+        """Names of the variables of a kind.
+
+        Parameters
+        ----------
+        kind : str
+            kind of the variables, see VARIABLE_KINDS
+
+        Returns
+        -------
+        list
+            variable names in the order they were added
+        """
+        return list(self._names[kind])
+
+    def variables(self, kind):
+        """Variables of a kind.
+
+        Parameters
+        ----------
+        kind : str
+            kind of the variables, see VARIABLE_KINDS
+
+        Returns
+        -------
+        np.ndarray
+            object array of the optlang variables in the order they were added
+        """
+        try:
+            return self._arrays[kind][0]
+        except KeyError:
+            names = self._names[kind]
+            variables = np.empty(len(names), dtype=object)
+            variables[:] = [self.solver.variables[name] for name in names]
+            positions = {name: i for i, name in enumerate(names)}
+            self._arrays[kind] = (variables, positions)
+            return variables
+
+    def index(self, kind, name):
+        """Position of a variable in the variables of its kind.
+
+        Parameters
+        ----------
+        kind : str
+            kind of the variable, see VARIABLE_KINDS
+        name : str
+            variable name
+
+        Returns
+        -------
+        int
+            position of the variable in variables(kind)
+        """
+        self.variables(kind)
+        return self._arrays[kind][1][name]
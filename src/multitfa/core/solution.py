@@ -1,4 +1,4 @@
-from numpy import empty, nan
+from numpy import array, fromiter, full, nan
 from pandas import DataFrame, Series
 
 
@@ -47,6 +47,91 @@ class Solution:
         return DataFrame({"fluxes": self.fluxes, "reduced_costs": self.reduced_costs})
 
 
+def _variable_positions(model, kind, names):
+    """Index of the variable positions of a Gurobi/Cplex interface, cached on the model.
+
+    The index is reused while the interface has the same variable names in the same
+    order, it is rebuilt when variables are added, removed or replaced.
+
+    Parameters
+    ----------
+    model : multitfa.core.tmodel
+        multitfa model
+    kind : str
+        'gurobi' or 'cplex'
+    names : list
+        variable names in interface order
+
+    Returns
+    -------
+    dict
+        cache entry with the 'positions' of the variable names
+    """
+    cache = model.__dict__.setdefault("_variable_positions", {})
+    entry = cache.get(kind)
+    if entry is None or entry["names"] != names:
+        entry = {
+            "names": names,
+            "positions": {name: i for i, name in enumerate(names)},
+        }
+        cache[kind] = entry
+    return entry
+
+
+def _take(entry, names):
+    """Positions of the variable names in an interface index, as an index array."""
+    positions = entry["positions"]
+    return array([positions[name] for name in names], dtype=int)
+
+
+def _solution(
+    objective_value,
+    status,
+    values,
+    entry,
+    reactions,
+    metabolites,
+    Gibbs_energy,
+    met_concentrations,
+    reduced=None,
+    shadow=None,
+):
+    """Builds the Solution from the bulk primal values of all the interface variables.
+
+    The requested variables are gathered by position.
+    """
+    rxn_index = [rxn.id for rxn in reactions]
+    delG_index = [getattr(delG, "name", delG) for delG in Gibbs_energy]
+    met_conc_index = [getattr(conc, "name", conc) for conc in met_concentrations]
+    met_index = [met.id for met in metabolites]
+
+    forward = _take(entry, rxn_index)
+    reverse = _take(entry, [rxn.reverse_id for rxn in reactions])
+    fluxes = values[forward] - values[reverse]
+    if reduced is None:
+        reduced = full(len(rxn_index), nan)
+    if shadow is None:
+        shadow = full(len(met_index), nan)
+
+    return Solution(
+        objective_value,
+        status,
+        Series(index=rxn_index, data=fluxes, name="fluxes"),
+        Series(index=rxn_index, data=reduced, name="reduced_costs"),
+        Series(index=met_index, data=shadow, name="shadow_prices"),
+        Series(
+            index=delG_index,
+            data=values[_take(entry, delG_index)],
+            name="Gibbs_energies",
+        ),
+        Series(
+            index=met_conc_index,
+            data=values[_take(entry, met_conc_index)],
+            name="metabolite_concentrations",
+        ),
+    )
+
+
 def get_solution(
     model,
     reactions=None,
@@ -55,85 +140,66 @@ def get_solution(
     met_concentrations=None,
     raise_error=False,
 ):
+    """Reads the solution of the optlang solver of the model.
+
+    All the primal values are fetched at once and the requested variables are gathered
+    by their positions.
+
+    Parameters
+    ----------
+    model : multitfa.core.tmodel
+        multitfa model after thermodynamic constraints are added
+
+    Returns
+    -------
+    Solution
+        solution of the model
+
+    Raises
+    ------
+    ValueError
+        If the model is not solved to optimality
+    """
 
     if model.solver.status != "optimal":
         raise ValueError("model status not optimal")
 
+    var_primals = model.solver.primal_values
+    # Primal values are keyed by name, positions follow their order
+    entry = {"positions": {name: i for i, name in enumerate(var_primals)}}
+    values = fromiter(var_primals.values(), dtype=float, count=len(var_primals))
+
     if reactions is None:
         reactions = model.reactions
     if metabolites is None:
         metabolites = model.metabolites
     if Gibbs_energy is None:
-        Gibbs_energy = [
-            var for var in model.solver.variables if var.name.startswith("dG_")
-        ]
+        Gibbs_energy = model.variable_registry.names("delG")
     if met_concentrations is None:
-        met_concentrations = [
-            var for var in model.solver.variables if var.name.startswith("lnc_")
-        ]
-
-    rxn_index = list()
-    delG_index = list()
-    met_conc_index = list()
-    fluxes = empty(len(reactions))
-    Gibbs_energies = empty(len(Gibbs_energy))
-    metabolite_concentrations = empty(len(met_concentrations))
-    reduced = empty(len(reactions))
-    var_primals = model.solver.primal_values
-    shadow = empty(len(metabolites))
-
-    if model.solver.is_integer:
-        reduced.fill(nan)
-        shadow.fill(nan)
-
-        for (i, rxn) in enumerate(reactions):
-            rxn_index.append(rxn.id)
-            fluxes[i] = var_primals[rxn.id] - var_primals[rxn.reverse_id]
+        met_concentrations = model.variable_registry.names("concentration")
 
-        for (i, delG) in enumerate(Gibbs_energy):
-            delG_index.append(delG.name)
-            Gibbs_energies[i] = var_primals[delG.name]
-
-        for (i, conc) in enumerate(met_concentrations):
-            met_conc_index.append(conc.name)
-            metabolite_concentrations[i] = var_primals[conc.name]
-
-        met_index = [met.id for met in metabolites]
-    else:
+    reduced, shadow = (None, None)
+    if not model.solver.is_integer:
         var_duals = model.solver.reduced_costs
-        for (i, rxn) in enumerate(reactions):
-            forward = rxn.id
-            reverse = rxn.reverse_id
-            rxn_index.append(forward)
-            fluxes[i] = var_primals[forward] - var_primals[reverse]
-            reduced[i] = var_duals[forward] - var_duals[reverse]
-
-        for (i, delG) in enumerate(Gibbs_energy):
-            delG_index.append(delG.name)
-            Gibbs_energies[i] = var_primals[delG.name]
-
-        for (i, conc) in enumerate(met_concentrations):
-            met_conc_index.append(conc.name)
-            metabolite_concentrations[i] = var_primals[conc.name]
-
-        met_index = list()
+        duals = fromiter(var_duals.values(), dtype=float, count=len(var_duals))
+        reduced = (
+            duals[_take(entry, [rxn.id for rxn in reactions])]
+            - duals[_take(entry, [rxn.reverse_id for rxn in reactions])]
+        )
         constr_duals = model.solver.shadow_prices
-        for (i, met) in enumerate(metabolites):
-            met_index.append(met.id)
-            shadow[i] = constr_duals[met.id]
+        shadow = array([constr_duals[met.id] for met in metabolites], dtype=float)
 
-    return Solution(
+    return _solution(
         model.solver.objective.value,
         model.solver.status,
-        Series(index=rxn_index, data=fluxes, name="fluxes"),
-        Series(index=rxn_index, data=reduced, name="reduced_costs"),
-        Series(index=met_index, data=shadow, name="shadow_prices"),
-        Series(index=delG_index, data=Gibbs_energies, name="Gibbs_energies"),
-        Series(
-            index=met_conc_index,
-            data=metabolite_concentrations,
-            name="metabolite_concentrations",
-        ),
+        values,
+        entry,
+        reactions,
+        metabolites,
+        Gibbs_energy,
+        met_concentrations,
+        reduced,
+        shadow,
     )
 
 
@@ -145,16 +211,41 @@ def get_legacy_solution(
     Gibbs_energy=None,
     met_concentrations=None,
     raise_error=False,
+    resolve=False,
 ):
+    """Reads the solution of the last solve of the Gurobi or Cplex interface.
+
+    Parameters
+    ----------
+    model : multitfa.core.tmodel
+        multitfa model after thermodynamic constraints are added
+    solver : str, optional
+        'gurobi' or 'cplex', by default "gurobi"
+    resolve : bool, optional
+        If True, the interface is solved again before reading the solution, by default
+        False (the interface must already be solved)
+
+    Returns
+    -------
+    Solution
+        solution of the model
+
+    Raises
+    ------
+    ValueError
+        If the interface is not solved to optimality
+    """
     solver_status = "not optimal"
     objective_value = "NA"
     if solver == "gurobi":
-        model.gurobi_interface.optimize()
+        if resolve:
+            model.gurobi_interface.optimize()
         if model.gurobi_interface.Status == 2:
             solver_status = "optimal"
             objective_value = model.gurobi_interface.ObjVal
     elif solver == "cplex":
-        model.cplex_interface.solve()
+        if resolve:
+            model.cplex_interface.solve()
         if model.cplex_interface.solution.is_primal_feasible():
             solver_status = "optimal"
             objective_value = model.cplex_interface.solution.get_objective_value()
@@ -175,73 +266,30 @@ def get_legacy_solution(
                 Gibbs_energy.extend([rxn.delG_forward.name, rxn.delG_reverse.name])
 
     if met_concentrations is None:
-        met_concentrations = [
-            var for var in model.solver.variables if var.name.startswith("lnc_")
-        ]
-
-    rxn_index = list()
-    delG_index = list()
-    met_conc_index = list()
-    fluxes = empty(len(reactions))
-    Gibbs_energies = empty(len(Gibbs_energy))
-    metabolite_concentrations = empty(len(met_concentrations))
-    reduced = empty(len(reactions))
-    shadow = empty(len(metabolites))
+        met_concentrations = model.variable_registry.names("concentration")
 
+    # All the values are fetched in one call
     if solver == "gurobi":
         solver_interface = model.gurobi_interface
-        reduced.fill(nan)
-        shadow.fill(nan)
-
-        for (i, rxn) in enumerate(reactions):
-            rxn_index.append(rxn.id)
-            fluxes[i] = (
-                solver_interface.getVarByName(rxn.id).x
-                - solver_interface.getVarByName(rxn.reverse_id).x
-            )
-
-        for (i, delG) in enumerate(Gibbs_energy):
-            delG_index.append(delG)
-            Gibbs_energies[i] = solver_interface.getVarByName(delG).x
-
-        for (i, conc) in enumerate(met_concentrations):
-            met_conc_index.append(conc.name)
-            metabolite_concentrations[i] = solver_interface.getVarByName(conc.name).x
-
-        met_index = [met.id for met in metabolites]
-
+        variables = solver_interface.getVars()
+        values = array(solver_interface.getAttr("X", variables), dtype=float)
+        entry = _variable_positions(
+            model, "gurobi", solver_interface.getAttr("VarName", variables)
+        )
     elif solver == "cplex":
         solver_interface = model.cplex_interface
-        reduced.fill(nan)
-        shadow.fill(nan)
-
-        for (i, rxn) in enumerate(reactions):
-            rxn_index.append(rxn.id)
-            fluxes[i] = solver_interface.solution.get_values(
-                rxn.id
-            ) - solver_interface.solution.get_values(rxn.reverse_id)
-
-        for (i, delG) in enumerate(Gibbs_energy):
-            delG_index.append(delG)
-            Gibbs_energies[i] = solver_interface.solution.get_values(delG)
-
-        for (i, conc) in enumerate(met_concentrations):
-            met_conc_index.append(conc.name)
-            metabolite_concentrations[i] = solver_interface.solution.get_values(
-                conc.name
-            )
-
-        met_index = [met.id for met in metabolites]
-    return Solution(
+        values = array(solver_interface.solution.get_values(), dtype=float)
+        entry = _variable_positions(
+            model, "cplex", solver_interface.variables.get_names()
+        )
+
+    return _solution(
         objective_value,
         solver_status,
-        Series(index=rxn_index, data=fluxes, name="fluxes"),
-        Series(index=rxn_index, data=reduced, name="reduced_costs"),
-        Series(index=met_index, data=shadow, name="shadow_prices"),
-        Series(index=delG_index, data=Gibbs_energies, name="Gibbs_energies"),
-        Series(
-            index=met_conc_index,
-            data=metabolite_concentrations,
-            name="metabolite_concentrations",
-        ),
+        values,
+        entry,
+        reactions,
+        metabolites,
+        Gibbs_energy,
+        met_concentrations,
     )
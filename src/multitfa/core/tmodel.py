@@ -1,43 +1,50 @@
+import logging
 import os
-import pickle
 import string
 import tempfile
+import time
 from copy import copy, deepcopy
+from functools import lru_cache, partial
 from pathlib import Path
 from random import choices
 
 import optlang
+import scipy.sparse as sp
 from cobra import Model
 from cobra.core.dictlist import DictList
-from equilibrator_api import ComponentContribution
-from scipy import stats
+from cobra.util.context import get_context
+from equilibrator_api import Q_, ComponentContribution
 from six import iteritems
 
+from ..util.compound_store import CompoundRecord, CompoundStore, resolve_compounds
 from ..util.constraints import delG_indicator, directionality
 from ..util.linalg_fun import *
 from ..util.thermo_constants import *
-from .compound import Thermo_met
+from .compound import Thermo_met, compound_vector
 from .reaction import thermo_reaction
+from .registry import VariableRegistry
 from .solution import get_legacy_solution, get_solution
 
 
-api = ComponentContribution()
-
-# present_dir = os.path.normpath(os.path.dirname(os.path.abspath(__file__)))
-cwd = os.getcwd()
+logger = logging.getLogger(__name__)
 
-import logging
+# Pickled compound cache of earlier versions, used to seed an empty compound store
+legacy_cache_file = Path(__file__).parent.parent / "data" / "compounds_cache.pickle"
 
 
-cache_file = Path(__file__).parent.parent / "data" / "compounds_cache.pickle"
+@lru_cache(maxsize=None)
+def get_api():
+    """equilibrator-api ComponentContribution object.
 
-logs_dir = cwd + os.sep + "logs"
-if not os.path.exists(logs_dir):
-    os.makedirs(logs_dir)
+    Created on first use, as it loads equilibrator's compound database and component
+    contribution parameters.
 
-logging.basicConfig(
-    filename=logs_dir + os.sep + "thermo_model.log", level=logging.DEBUG
-)
+    Returns
+    -------
+    equilibrator_api.ComponentContribution
+        equilibrator api object
+    """
+    return ComponentContribution()
 
 
 class tmodel(Model):
@@ -121,6 +128,18 @@ class tmodel(Model):
         self.solver.configuration.tolerances.integrality = tolerance_integral
         self._var_update = False
 
+    def __getstate__(self):
+        """Get state for serialization.
+
+        The Gurobi/Cplex interfaces can't be pickled, they are dropped and rebuilt on
+        first access, for example in worker processes.
+        """
+        state = super().__getstate__()
+        state.pop("_gurobi_interface", None)
+        state.pop("_cplex_interface", None)
+        state.pop("_variable_positions", None)
+        return state
+
     @property
     def gurobi_interface(self):
         """multiTFA at the moment supports two solvers Gurobi/Cplex for solving quadratic constraint problems. Optlang doesn't support adding QC, so we chose to add two separate solver interafaces to tmodel. This is gurobi solver interface. In addition to the linear constraints, this interface contain one extra constraint to represent sphere
@@ -204,9 +223,55 @@ class tmodel(Model):
 
     @property
     def component_variables(self):
-        return np.array(
-            [var for var in self.variables if var.name.startswith("component_")]
-        )
+        return self.variable_registry["component"]
+
+    @property
+    def variable_registry(self):
+        """Registry of the thermodynamic variables of the model by kind.
+
+        The kinds are concentration, error, delG, indicator, component, sphere_small
+        and sphere_large, see core/registry.py. The registry is kept up to date by
+        add_cons_vars and remove_cons_vars, and rebuilt when the solver is replaced.
+
+        Returns
+        -------
+        multitfa.core.registry.VariableRegistry
+            registry of the variables of the model solver
+        """
+        try:
+            if self._variable_registry.solver is self.solver:
+                return self._variable_registry
+        except AttributeError:
+            pass
+        self._variable_registry = VariableRegistry(self.solver)
+        return self._variable_registry
+
+    @property
+    def compound_store(self):
+        """Persistent store of equilibrator compounds, see util/compound_store.py.
+
+        By default the store is located in the user cache directory (or
+        'MULTITFA_CACHE_DIR'), assign a CompoundStore or a file path to use a different
+        location.
+
+        Returns
+        -------
+        multitfa.util.compound_store.CompoundStore
+            compound store used to resolve the metabolite identifiers
+        """
+        try:
+            return self._compound_store
+        except AttributeError:
+            self._compound_store = CompoundStore()
+            if len(self._compound_store) == 0 and os.path.isfile(legacy_cache_file):
+                self._compound_store.import_legacy_cache(legacy_cache_file)
+            return self._compound_store
+
+    @compound_store.setter
+    def compound_store(self, value):
+        if not isinstance(value, CompoundStore):
+            value = CompoundStore(value)
+        self._compound_store = value
 
     @property
     def metabolite_equilibrator_accessions(self):
@@ -218,64 +283,120 @@ class tmodel(Model):
             )
             return self._metabolite_equilibrator_accessions
 
+    @property
+    def compound_records(self):
+        """Compound records of the model metabolites.
+
+        A record holds the equilibrator compound, its microspecies and compound vector.
+
+        Returns
+        -------
+        dict
+            Dictionary of metabolite database identifier to CompoundRecord
+        """
+        try:
+            return self._compound_records
+        except AttributeError:
+            self._metabolite_equilibrator_accessions = (
+                self.populate_metabolite_properties()
+            )
+            return self._compound_records
+
     def populate_metabolite_properties(self):
-        """Local cache file for equilibrator-api data. This is a temporary fix till equilibrator's cache
+        """Retrieves the equilibrator compounds of the model metabolites.
+
+        Compounds are read from the persistent compound store, only identifiers missing
+        from the store are fetched from equilibrator and written back to the store.
 
         Returns
         -------
         dict
             Dictionary of metabolite id to corresponding equilibrator compound object
         """
-        if os.path.isfile(cache_file):
-            with open(cache_file, "rb") as handle:
-                metabolite_accessions, microspecies, mg_dissociation_data = pickle.load(
-                    handle
+        identifiers = {
+            metabolite.Kegg_id
+            for metabolite in self.metabolites
+            if metabolite.Kegg_id != "NA"
+        }
+        self._compound_records = self._fetch_compound_records(identifiers)
+
+        return {
+            metabolite.id: self._metabolite_accession(metabolite)
+            for metabolite in self.metabolites
+        }
+
+    def _fetch_compound_records(self, identifiers):
+        """Compound records of database identifiers.
+
+        Records are read from the compound store, missing identifiers are resolved in
+        bulk against equilibrator and written back to the store.
+
+        Parameters
+        ----------
+        identifiers : set
+            metabolite database identifiers
+
+        Returns
+        -------
+        dict
+            Dictionary of identifier to CompoundRecord, unresolved identifiers are left
+            out
+        """
+        records = self.compound_store.get_many(identifiers)
+
+        new_records = {}
+        for identifier, record in records.items():
+            # Records without (or with outdated) compound vectors are updated
+            if record.compound_vector is None or len(record.compound_vector) != (
+                get_cc_data().Nc + get_cc_data().Ng
+            ):
+                new_records[identifier] = record._replace(
+                    compound_vector=compound_vector(record.compound)
                 )
-        else:
-            metabolite_accessions, microspecies, mg_dissociation_data = ({}, {}, {})
 
-        accessions = {}
-        for metabolite in self.metabolites:
-            if metabolite.Kegg_id in metabolite_accessions:
-                accessions[metabolite.id] = metabolite_accessions[metabolite.Kegg_id]
-                logging.debug("{} fetched from cache data".format(metabolite.id))
-            else:
-                if metabolite.Kegg_id == "NA":
-                    eq_accession = None
-                    logging.debug(
-                        "Database identifier not available for {}, ignoring from thermodynamic analysis".format(
-                            metabolite.id
-                        )
-                    )
-                else:
-                    try:
-                        eq_accession = api.get_compound(metabolite.Kegg_id)
-                    except:
-                        eq_accession = None
-                        logging.debug(
-                            "Unable to fetch data from eQuilibrator for the metabolite {}, ignoring from thermodynamic analysis".format(
-                                metabolite.id
-                            )
-                        )
-                accessions[metabolite.id] = eq_accession
-                # update the cache file
-                if eq_accession is not None:
-                    metabolite_accessions[metabolite.Kegg_id] = eq_accession
-                    microspecies[metabolite.Kegg_id] = eq_accession.microspecies
-                    mg_dissociation_data[
-                        metabolite.Kegg_id
-                    ] = eq_accession.magnesium_dissociation_constants
-
-        # Try and update the cache file with updated values
-        try:
-            with open(cache_file, "wb") as handle:
-                pickle.dump(
-                    [metabolite_accessions, microspecies, mg_dissociation_data], handle
+        # Resolve the missing compounds in bulk, once per unique identifier. The api is
+        # only created if needed, warm builds don't touch equilibrator
+        missing = identifiers.difference(records)
+        if missing:
+            resolved = resolve_compounds(get_api(), missing)
+            for identifier, eq_accession in resolved.items():
+                new_records[identifier] = CompoundRecord.from_compound(
+                    eq_accession, compound_vector(eq_accession)
                 )
-        except:
-            pass
 
-        return accessions
+        # Update the store with the new records only
+        self.compound_store.put_many(new_records)
+        records.update(new_records)
+        return records
+
+    def _metabolite_accession(self, metabolite):
+        """Equilibrator compound of a metabolite from the model compound records.
+
+        Parameters
+        ----------
+        metabolite : core.compound.Thermo_met
+            model metabolite
+
+        Returns
+        -------
+        equilibrator_cache.models.Compound or None
+            equilibrator compound, None if the identifier isn't available or couldn't be
+            resolved
+        """
+        if metabolite.Kegg_id in self._compound_records:
+            logger.debug("{} fetched from compound store".format(metabolite.id))
+            return self._compound_records[metabolite.Kegg_id].compound
+        elif metabolite.Kegg_id == "NA":
+            logger.debug(
+                "Database identifier not available for {}, ignoring from "
+                "thermodynamic analysis".format(metabolite.id)
+            )
+        else:
+            logger.debug(
+                "Unable to fetch data from eQuilibrator for the metabolite {}, "
+                "ignoring from thermodynamic analysis".format(metabolite.id)
+            )
+        return None
 
     @property
     def compound_vector_matrix(self):
@@ -283,30 +404,287 @@ class tmodel(Model):
             return self._compound_vector_matrix
         except AttributeError:
             # Initialize the matrix with zeros
-            comp_vector = np.zeros((len(self.metabolites), Nc + Ng))
+            cc_data = get_cc_data()
+            comp_vector = np.zeros((len(self.metabolites), cc_data.Nc + cc_data.Ng))
             for metabolite in self.metabolites:
                 met_index = self.metabolites.index(metabolite)
                 comp_vector[met_index, :] = metabolite.compound_vector
             self._compound_vector_matrix = comp_vector
             return self._compound_vector_matrix
 
+    @property
+    def covariance_decomposition(self):
+        """Decomposition of the covariance of the components present in the model.
+
+        Used by the quadratic constraints and the sampling approaches. Holds the
+        covariance of the components present in the model, the split in low and high
+        variance components, the cholesky factor and chi-square value of each group.
+        Decompositions are cached per set of model components and the cache is reset
+        when metabolites are added to or removed from the model.
+
+        Returns
+        -------
+        multitfa.util.linalg_fun.CovarianceDecomposition
+            covariance decomposition of the model components
+        """
+        component_indices = self._component_indices()
+        key = tuple(component_indices)
+        try:
+            return self._covariance_decompositions[key]
+        except AttributeError:
+            self._covariance_decompositions = {}
+        except KeyError:
+            pass
+        self._covariance_decompositions[key] = decompose_covariance(
+            get_cc_data().covariance, component_indices
+        )
+        return self._covariance_decompositions[key]
+
+    def _component_indices(self):
+        """Indices of the components present in the compound vectors of the model."""
+        return np.flatnonzero(np.any(self.compound_vector_matrix, axis=0))
+
+    @property
+    def stoichiometric_matrix(self):
+        """Sparse stoichiometric matrix (metabolites * reactions) of the model.
+
+        Rows follow the order of model.metabolites and columns the order of
+        model.reactions. The matrix is built once and cached, it is reset when reactions
+        or metabolites are added to or removed from the model.
+
+        Returns
+        -------
+        scipy.sparse.csc_matrix
+            stoichiometric matrix of the model
+        """
+        try:
+            return self._stoichiometric_matrix
+        except AttributeError:
+            self._stoichiometric_matrix = self._build_stoichiometric_matrix()
+            return self._stoichiometric_matrix
+
+    def _build_stoichiometric_matrix(self):
+        """Builds the sparse stoichiometric matrix in a single pass over the reactions.
+
+        Rows are looked up in a precomputed metabolite to row index.
+
+        Returns
+        -------
+        scipy.sparse.csc_matrix
+            stoichiometric matrix (metabolites * reactions)
+        """
+        metabolite_index = {
+            metabolite.id: i for i, metabolite in enumerate(self.metabolites)
+        }
+        rows, columns, coefficients = ([], [], [])
+        for j, reaction in enumerate(self.reactions):
+            for metabolite, stoic in iteritems(reaction.metabolites):
+                rows.append(metabolite_index[metabolite.id])
+                columns.append(j)
+                coefficients.append(stoic)
+
+        return sp.coo_matrix(
+            (coefficients, (rows, columns)),
+            shape=(len(self.metabolites), len(self.reactions)),
+        ).tocsc()
+
+    def _reset_stoichiometry(self):
+        """Removes the cached stoichiometric matrix, it is rebuilt on next access."""
+        try:
+            del self._stoichiometric_matrix
+        except AttributeError:
+            pass
+
+    def _reset_compound_vectors(self):
+        """Removes the cached compound vector matrix and covariance decompositions.
+
+        They are rebuilt on next access.
+        """
+        for attribute in ("_compound_vector_matrix", "_covariance_decompositions"):
+            try:
+                delattr(self, attribute)
+            except AttributeError:
+                pass
+
+    def add_metabolites(self, *args, **kwargs):
+        self._reset_on_exit(self._reset_stoichiometry)
+        self._reset_on_exit(self._reset_compound_vectors)
+        super().add_metabolites(*args, **kwargs)
+        self._reset_stoichiometry()
+        self._reset_compound_vectors()
+
+    def remove_metabolites(self, *args, **kwargs):
+        self._reset_on_exit(self._reset_stoichiometry)
+        self._reset_on_exit(self._reset_compound_vectors)
+        super().remove_metabolites(*args, **kwargs)
+        self._reset_stoichiometry()
+        self._reset_compound_vectors()
+
+    def add_reactions(self, *args, **kwargs):
+        self._reset_on_exit(self._reset_stoichiometry)
+        super().add_reactions(*args, **kwargs)
+        self._reset_stoichiometry()
+
+    def remove_reactions(self, *args, **kwargs):
+        self._reset_on_exit(self._reset_stoichiometry)
+        super().remove_reactions(*args, **kwargs)
+        self._reset_stoichiometry()
+
+    def _reset_on_exit(self, reset):
+        """Registers a cache reset with the model context, if any.
+
+        cobra undoes the changes of a context on the model lists directly, so the
+        cached matrices are reset once the changes are undone. The reset is registered
+        before the change, as undo functions run in reverse order.
+        """
+        context = get_context(self)
+        if context:
+            context(reset)
+
+    def add_cons_vars(self, what, **kwargs):
+        super().add_cons_vars(what, **kwargs)
+        registry = self.variable_registry
+        registry.add(what)
+        context = get_context(self)
+        if context:
+            context(partial(registry.remove, what))
+
+    def remove_cons_vars(self, what):
+        super().remove_cons_vars(what)
+        registry = self.variable_registry
+        registry.remove(what)
+        context = get_context(self)
+        if context:
+            context(partial(registry.add, what))
+
+    @property
+    def core_reaction_indices(self):
+        """Indices of the reactions included in the thermodynamic analysis.
+
+        Indices are in model.reactions order.
+
+        Returns
+        -------
+        np.ndarray
+            indices of the non excluded reactions
+        """
+        excluded = set(self.Exclude_reactions)
+        return np.array(
+            [i for i, rxn in enumerate(self.reactions) if rxn.id not in excluded],
+            dtype=int,
+        )
+
     def core_stoichiometry(self):
-        n_core_rxn = len(self.reactions) - len(self.Exclude_reactions)
-        stoichiometry_core = np.zeros((n_core_rxn, len(self.metabolites)))
-        i = 0
-        rxn_var_name = []
-        for reaction in self.reactions:
-            if reaction.id in self.Exclude_reactions:
-                continue
-            rxn_stoichiometry = reaction.cal_stoichiometric_matrix()
-            stoichiometry_core[i, :] = rxn_stoichiometry
+        """Stoichiometry of the reactions included in the thermodynamic analysis.
+
+        The matrix is core reactions * metabolites.
 
-            i = i + 2
+        Returns
+        -------
+        Tuple
+            Tuple of forward/reverse variable names of core reactions, np.ndarray of
+            core stoichiometry
+        """
+        core_indices = self.core_reaction_indices
+        rxn_var_name = []
+        for i in core_indices:
+            reaction = self.reactions[i]
             rxn_var_name.extend(
                 [reaction.forward_variable.name, reaction.reverse_variable.name]
             )
+        stoichiometry_core = self.stoichiometric_matrix[:, core_indices].T.toarray()
+
         return (rxn_var_name, stoichiometry_core)
 
+    def calculate_std_dev(self):
+        """Calculates the formation energy standard deviation of the metabolites.
+
+        One covariance product, compound_vector_matrix @ covariance @
+        compound_vector_matrix.T restricted to its diagonal. Only the components present
+        in the model are used and the sparse compound vectors are multiplied with the
+        reduced covariance, the covariance decomposition is left to the quadratic
+        constraints and sampling that need it. Populates the std_dev of the metabolites.
+
+        Returns
+        -------
+        np.ndarray
+            standard deviation of formation energy of the metabolites, in
+            model.metabolites order
+        """
+        component_indices = self._component_indices()
+        covariance = get_cc_data().covariance[
+            np.ix_(component_indices, component_indices)
+        ]
+        compound_vectors = sp.csr_matrix(
+            self.compound_vector_matrix[:, component_indices]
+        )
+        variances = np.asarray(
+            compound_vectors.multiply(compound_vectors @ covariance).sum(axis=1)
+        ).ravel()
+        std_devs = np.sqrt(variances)
+
+        for metabolite, std_dev in zip(self.metabolites, std_devs):
+            metabolite._std_dev = std_dev
+
+        return std_devs
+
+    def calculate_delG_f(self):
+        """Calculates the transformed formation and reaction Gibbs energies in bulk.
+
+        Standard formation energies are one product, compound_vector_matrix @ mu.
+        Legendre transforms are calculated once per compound and compartment condition
+        (pH, ionic strength), with the quantities of each compartment built once. Only
+        metabolites and reactions without delG_f/delG_prime are populated, values set by
+        the user are kept.
+
+        Returns
+        -------
+        np.ndarray
+            transformed Gibbs energy of formation of the metabolites in kJ/mol, in
+            model.metabolites order
+        """
+        std_delG_f = sp.csr_matrix(self.compound_vector_matrix) @ get_cc_data().mu
+        has_components = np.any(self.compound_vector_matrix, axis=1)
+
+        temperature = Q_(str(default_T) + " K")
+        compartment_conditions, transforms = ({}, {})
+        delG_f = np.zeros(len(self.metabolites))
+        for i, metabolite in enumerate(self.metabolites):
+            try:
+                delG_f[i] = metabolite._delG_f
+                continue
+            except AttributeError:
+                pass
+
+            delG_f[i] = std_delG_f[i]
+            if has_components[i]:
+                if metabolite.compartment not in compartment_conditions:
+                    compartment_conditions[metabolite.compartment] = (
+                        Q_(self.compartment_info["pH"][metabolite.compartment]),
+                        Q_(
+                            str(self.compartment_info["I"][metabolite.compartment])
+                            + " M"
+                        ),
+                    )
+                p_h, ionic_strength = compartment_conditions[metabolite.compartment]
+
+                compound = metabolite.equilibrator_accession
+                key = (compound.id, p_h.magnitude, ionic_strength.magnitude)
+                if key not in transforms:
+                    transform = compound.transform(
+                        p_h=p_h, ionic_strength=ionic_strength, temperature=temperature
+                    )
+                    transforms[key] = transform.to_base_units().magnitude * 1e-3
+                delG_f[i] += transforms[key]
+            metabolite._delG_f = delG_f[i]
+
+        delG_prime = self.stoichiometric_matrix.T @ delG_f
+        for reaction, rxn_delG in zip(self.reactions, delG_prime):
+            if not hasattr(reaction, "_delG_prime"):
+                reaction._delG_prime = rxn_delG
+
+        return delG_f
+
     def update_thermo_variables(self):
         """Generates reaction and metabolite variables required for thermodynamic analysis and adds to the model. We use two different methods to solve the tMFA problem. Traditional 'box' method employs MILP problem where components are allowed to vary between some s.d from mean. The other method uses MIQCP structure to use covariance matrix to capture covariance. Two methods share some common variables, where as MIQCP method requires independent variables to sample from original solution space.
 
@@ -317,6 +695,9 @@ class tmodel(Model):
         """
         self._var_update = False
 
+        # Formation energy standard deviations of all the metabolites in one product
+        self.calculate_std_dev()
+
         # Add metabolite concentration variable and error variable for the metabolite
         conc_variables, dG_err_vars = ([], [])
         for metabolite in self.metabolites:
@@ -384,11 +765,14 @@ class tmodel(Model):
         if not self._var_update:
             self.update_thermo_variables()
 
+        # Formation and reaction Gibbs energies of the whole model in bulk
+        self.calculate_delG_f()
+
         rxn_constraints = []
         # Now add reaction variables and generate remaining constraints
         for rxn in self.reactions:
             if rxn.id in self.Exclude_reactions:
-                logging.debug(
+                logger.debug(
                     "Reaction {} is excluded from thermodyanmic analysis".format(rxn.id)
                 )
                 continue
@@ -436,21 +820,327 @@ class tmodel(Model):
         return rxn_constraints
 
     def update(self):
-        """Adds the generated thermo constaints to  model. Checks for duplication"""
+        """Adds the generated thermo constaints to  model.
+
+        Checks for duplication, constraints already in the model are removed in one
+        batch and all the constraints are added with a single add_cons_vars call.
+
+        Returns
+        -------
+        dict
+            wall time in seconds of the 'generate', 'remove' and 'add' phases
+        """
+        timings = {}
+        start = time.perf_counter()
         thermo_constraints = self._generate_constraints()
+        timings["generate"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        existing = set(self.constraints.keys())
+        duplicates = [cons.name for cons in thermo_constraints if cons.name in existing]
+        if duplicates:
+            logger.warning(
+                "{} constraints already in the model, removing previous entries: "
+                "{}".format(len(duplicates), ", ".join(duplicates))
+            )
+            self.solver.remove(duplicates)
+        timings["remove"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.add_cons_vars(thermo_constraints)
+        timings["add"] = time.perf_counter() - start
+
+        logger.info(
+            "Added {} thermodynamic constraints in {:.2f} s (generate "
+            "{generate:.2f} s, remove {remove:.2f} s, add {add:.2f} s)".format(
+                len(thermo_constraints), sum(timings.values()), **timings
+            )
+        )
+        return timings
+
+    def patch_delG_constraints(self, reactions):
+        """Updates the right hand side of the delG constraints of reactions in place.
+
+        The right hand side is set from the current delG_prime and delG_transport. The
+        constraints are patched in the optlang model and in the Gurobi/Cplex interfaces
+        if they were already built, so changing the Gibbs energy of a few reactions
+        doesn't require regenerating the constraints with update() or rebuilding the QC
+        problem. Excluded reactions and reactions without delG constraints in the model
+        are skipped.
 
-        for cons in thermo_constraints:
-            if cons.name not in self.constraints:
-                self.add_cons_vars([cons])
-                logging.debug("Constraint {} added to the model".format(cons.name))
+        Parameters
+        ----------
+        reactions : iterable
+            thermo_reaction objects whose Gibbs energy changed
+
+        Returns
+        -------
+        dict
+            Dictionary of patched delG constraint name to right hand side
+        """
+        excluded = set(self.Exclude_reactions)
+        rhs = {}
+        for reaction in set(reactions):
+            if reaction.id in excluded:
+                continue
+            forward = "delG_{}".format(reaction.forward_variable.name)
+            if forward not in self.constraints:
+                continue
+            value = reaction.delG_prime + reaction.delG_transport
+            rhs[forward] = value
+            rhs["delG_{}".format(reaction.reverse_variable.name)] = -value
+
+        for name, value in rhs.items():
+            constraint = self.constraints[name]
+            # Move the bound that keeps lb <= ub first
+            if value > constraint.ub:
+                constraint.ub = value
+                constraint.lb = value
+            else:
+                constraint.lb = value
+                constraint.ub = value
+
+        gurobi_model = getattr(self, "_gurobi_interface", None)
+        if gurobi_model is not None and rhs:
+            for name, value in rhs.items():
+                gurobi_model.getConstrByName(name).RHS = value
+            gurobi_model.update()
+
+        cplex_model = getattr(self, "_cplex_interface", None)
+        if cplex_model is not None and rhs:
+            cplex_model.linear_constraints.set_rhs(list(rhs.items()))
+
+        logger.debug("Patched {} delG constraints".format(len(rhs)))
+        return rhs
+
+    def set_compartment_pH(self, compartment, pH):
+        """Changes the pH of a compartment and updates the thermodynamic constraints.
+
+        Formation energies of the compartment metabolites, Gibbs energies of their
+        reactions and transport energies of the reactions crossing the compartment are
+        recalculated (values set by the user on these objects are replaced), then only
+        the affected delG constraints are patched, see patch_delG_constraints. Changes
+        made in a model context are undone when it exits.
+
+        Parameters
+        ----------
+        compartment : str
+            compartment symbol, row index of compartment_info
+        pH : float
+            new pH of the compartment
+
+        Returns
+        -------
+        dict
+            Dictionary of patched delG constraint name to right hand side
+        """
+        old_pH = self.compartment_info.loc[compartment, "pH"]
+        self.compartment_info.loc[compartment, "pH"] = pH
+
+        metabolites = [
+            met for met in self.metabolites if met.compartment == compartment
+        ]
+        reactions, cached = (set(), [])
+        for metabolite in metabolites:
+            for attribute in ("_delG_f", "_major_ms"):
+                cached.append(
+                    (metabolite, attribute, metabolite.__dict__.pop(attribute, None))
+                )
+            reactions.update(metabolite.reactions)
+        for reaction in reactions:
+            attributes = ["_delG_prime"]
+            if len(reaction.compartments) == 2:
+                attributes.append("_delG_transport")
+            for attribute in attributes:
+                cached.append(
+                    (reaction, attribute, reaction.__dict__.pop(attribute, None))
+                )
+
+        context = get_context(self)
+        if context:
+            context(
+                partial(
+                    self._restore_compartment, compartment, old_pH, cached, reactions
+                )
+            )
+
+        # Recalculates the removed formation and reaction Gibbs energies in bulk
+        self.calculate_delG_f()
+        return self.patch_delG_constraints(reactions)
+
+    def _restore_compartment(self, compartment, pH, cached, reactions):
+        """Restores the pH of a compartment and the Gibbs energies cached before
+        set_compartment_pH, then patches the delG constraints of the reactions.
+        """
+        self.compartment_info.loc[compartment, "pH"] = pH
+        for obj, attribute, value in cached:
+            if value is None:
+                obj.__dict__.pop(attribute, None)
             else:
-                logging.warning(
-                    "Constraint {} already in the model, removing previous entry".format(
-                        cons.name
+                obj.__dict__[attribute] = value
+        self.patch_delG_constraints(reactions)
+
+    def _update_metabolite_identifier(self, metabolite):
+        """Updates a metabolite and its constraints after its identifier changed.
+
+        The compound is resolved through the compound store, the cached properties of
+        the metabolite and its reactions are recalculated and the bounds of its error
+        variable, the coefficients (if it became or stopped being a proton) and right
+        hand sides of the delG constraints of its reactions are patched in place. Sphere
+        coefficients of the Gurobi/Cplex interfaces are patched if the set of model
+        components is unchanged, otherwise the interfaces are dropped and rebuilt on
+        next access.
+
+        Parameters
+        ----------
+        metabolite : core.compound.Thermo_met
+            model metabolite whose Kegg_id changed
+
+        Returns
+        -------
+        dict
+            Dictionary of patched delG constraint name to right hand side
+        """
+        was_proton, was_excluded = (metabolite.is_proton, metabolite.is_exclude)
+        old_components = tuple(self._component_indices())
+
+        if metabolite.Kegg_id != "NA":
+            self._compound_records.update(
+                self._fetch_compound_records({metabolite.Kegg_id})
+            )
+        accession = self._metabolite_accession(metabolite)
+        self._metabolite_equilibrator_accessions[metabolite.id] = accession
+
+        for attribute in (
+            "_equilibrator_accession",
+            "_compound_vector",
+            "_delG_f",
+            "_std_dev",
+            "_major_ms",
+        ):
+            metabolite.__dict__.pop(attribute, None)
+        if hasattr(self, "_compound_vector_matrix"):
+            self._compound_vector_matrix[self.metabolites.index(metabolite), :] = (
+                metabolite.compound_vector
+            )
+
+        if metabolite.is_exclude != was_excluded:
+            logger.warning(
+                "Component contribution coverage of {} changed, call update() to "
+                "regenerate the excluded reactions and constraints".format(
+                    metabolite.id
+                )
+            )
+
+        excluded = set(self.Exclude_reactions)
+        reactions = [rxn for rxn in metabolite.reactions if rxn.id not in excluded]
+        for reaction in metabolite.reactions:
+            reaction.__dict__.pop("_delG_prime", None)
+        self.calculate_delG_f()
+
+        err_name = "dG_err_{}".format(metabolite.id)
+        if err_name in self.variables:
+            bound = 1.96 * np.sqrt(metabolite.std_dev)
+            self.variables[err_name].set_bounds(-bound, bound)
+
+        is_proton = bool(metabolite.is_proton)
+        if is_proton != bool(was_proton):
+            conc_var = "lnc_{}".format(metabolite.id)
+            for reaction in reactions:
+                forward = "delG_{}".format(reaction.forward_variable.name)
+                if forward not in self.constraints:
+                    continue
+                stoic = 0 if is_proton else reaction.metabolites[metabolite]
+                coefficients = {
+                    self.variables[conc_var]: RT * stoic,
+                    self.variables[err_name]: stoic,
+                }
+                self.constraints[forward].set_linear_coefficients(
+                    {var: -coef for var, coef in coefficients.items()}
+                )
+                self.constraints[
+                    "delG_{}".format(reaction.reverse_variable.name)
+                ].set_linear_coefficients(coefficients)
+
+        new_components = tuple(self._component_indices())
+        if is_proton != bool(was_proton) or new_components != old_components:
+            for attribute in ("_gurobi_interface", "_cplex_interface"):
+                if self.__dict__.pop(attribute, None) is not None:
+                    logger.info(
+                        "Model components changed, {} is rebuilt on next access".format(
+                            attribute[1:]
+                        )
                     )
+        else:
+            self._patch_sphere_coefficients(reactions)
+
+        return self.patch_delG_constraints(reactions)
+
+    def _patch_sphere_coefficients(self, reactions):
+        """Updates the sphere coefficients of delG constraints in the QC interfaces.
+
+        Gurobi/Cplex interfaces are only patched if they were already built. The
+        coefficients are calculated as in Quadratic_constraint, sqrt(chi-square) * S.T @
+        compound_vector @ cholesky.
+
+        Parameters
+        ----------
+        reactions : list
+            thermo_reaction objects with delG constraints
+        """
+        gurobi_model = getattr(self, "_gurobi_interface", None)
+        cplex_model = getattr(self, "_cplex_interface", None)
+        if (gurobi_model is None and cplex_model is None) or not reactions:
+            return
+
+        decomposition = self.covariance_decomposition
+        rxn_indices = [self.reactions.index(reaction) for reaction in reactions]
+        rxn_compound_vector = (
+            self.stoichiometric_matrix[:, rxn_indices].T
+            @ self.compound_vector_matrix[:, decomposition.component_indices]
+        )
+
+        spheres = []
+        if len(decomposition.low_variance_indices) > 0:
+            spheres.append(
+                (
+                    "Sphere1_{}",
+                    np.sqrt(decomposition.chi2_small)
+                    * rxn_compound_vector
+                    @ decomposition.cholesky_small,
                 )
-                self.solver.remove(cons.name)
-                self.add_cons_vars([cons])
+            )
+        if len(decomposition.high_variance_indices) > 0:
+            spheres.append(
+                (
+                    "Sphere2_{}",
+                    np.sqrt(decomposition.chi2_large)
+                    * rxn_compound_vector
+                    @ decomposition.cholesky_large,
+                )
+            )
+
+        triplets = []
+        for i, reaction in enumerate(reactions):
+            forward = "delG_{}".format(reaction.forward_variable.name)
+            reverse = "delG_{}".format(reaction.reverse_variable.name)
+            for var_format, coefficients in spheres:
+                for j, coefficient in enumerate(coefficients[i]):
+                    var_name = var_format.format(j)
+                    triplets.append((forward, var_name, -coefficient))
+                    triplets.append((reverse, var_name, coefficient))
+
+        if gurobi_model is not None:
+            for cons_name, var_name, coefficient in triplets:
+                gurobi_model.chgCoeff(
+                    gurobi_model.getConstrByName(cons_name),
+                    gurobi_model.getVarByName(var_name),
+                    coefficient,
+                )
+            gurobi_model.update()
+
+        if cplex_model is not None:
+            cplex_model.linear_constraints.set_coefficients(triplets)
 
     def optimize(self, solve_method="QC", raise_error=False):
         """solves the model with given constraints. By default, we try to solve the model with quadratic constraints. Note: Quadratic constraints are supported by Gurobi/Cplex currently. if either of two solvers are not found, one can solve 'box' type MILP problem.
@@ -468,7 +1158,7 @@ class tmodel(Model):
                 optlang.available_solvers["GUROBI"]
                 or optlang.available_solvers["CPLEX"]
             ):
-                logging.warning(
+                logger.warning(
                     "GUROBI/CPLEX not available, Quadratic constraints are not supported by current solver"
                 )
                 print(
@@ -485,7 +1175,7 @@ class tmodel(Model):
                 return solution
 
             elif self.solver.__class__.__module__ == "optlang.cplex_interface":
-                solution = self.cplex_interface.solve()
+                self.cplex_interface.solve()
                 solution = get_legacy_solution(self, solver="cplex")
 
                 return solution
@@ -510,63 +1200,26 @@ class tmodel(Model):
         :rtype: [type]
         """
 
-        # Pick indices of components present in the current model
-        model_component_indices = [
-            i
-            for i in range(self.compound_vector_matrix.shape[1])
-            if np.any(self.compound_vector_matrix[:, i])
-        ]
+        # Cached decomposition of the covariance of the components present in the model
+        decomposition = self.covariance_decomposition
+        high_variance_indices = decomposition.high_variance_indices
+        low_variance_indices = decomposition.low_variance_indices
 
         # Reduced the compound_vector to contain only the non zero entries
-        model_compound_vector = self.compound_vector_matrix[:, model_component_indices]
-
-        # Now extract the sub covariance matrix containing only the components present in the model
-        component_model_covariance = covariance[:, model_component_indices][
-            model_component_indices, :
+        model_compound_vector = self.compound_vector_matrix[
+            :, decomposition.component_indices
         ]
 
-        # Now separate the compounds that have variance > 1000 and others to avoid numerical issues
-        high_variance_indices = np.where(np.diag(component_model_covariance) > 1000)[0]
-        low_variance_indices = np.where(np.diag(component_model_covariance) < 1000)[0]
-
-        # Calculate cholesky matrix for two different covariance matrices
         if len(low_variance_indices) > 0:
-            small_component_covariance = component_model_covariance[
-                :, low_variance_indices
-            ][low_variance_indices, :]
-            cholesky_small_variance = matrix_decomposition(small_component_covariance)
-            chi2_value_small = stats.chi2.isf(
-                q=0.05, df=cholesky_small_variance.shape[1]
-            )  # Chi-square value to map confidence interval
-
-            for i in high_variance_indices:
-                zeros_axis = np.zeros((cholesky_small_variance.shape[1],))
-                cholesky_small_variance = np.insert(
-                    cholesky_small_variance, i, zeros_axis, axis=0
-                )
-
+            cholesky_small_variance = decomposition.cholesky_small
+            chi2_value_small = decomposition.chi2_small
             metabolite_sphere_small = (
                 model_compound_vector @ cholesky_small_variance
             )  # This is a fixed term compound_vector @ cholesky
 
         if len(high_variance_indices) > 0:
-            large_component_covariance = component_model_covariance[
-                :, high_variance_indices
-            ][
-                high_variance_indices, :
-            ]  # Covariance matrix for the high variance components
-
-            cholesky_large_variance = matrix_decomposition(large_component_covariance)
-            chi2_value_high = stats.chi2.isf(
-                q=0.05, df=cholesky_large_variance.shape[1]
-            )
-
-            # Insert empty rows for the low_variance_components
-            for i in low_variance_indices:
-                zeros_axis = np.zeros((cholesky_large_variance.shape[1],))
-                cholesky_large_variance = np.insert(
-                    cholesky_large_variance, i, zeros_axis, axis=0
-                )
+            cholesky_large_variance = decomposition.cholesky_large
+            chi2_value_high = decomposition.chi2_large
             metabolite_sphere_large = (
                 model_compound_vector @ cholesky_large_variance
             )  # This is a fixed term compound_vector @ cholesky
@@ -906,35 +1559,42 @@ class tmodel(Model):
 
         else:
             raise NotImplementedError("Current solver doesn't support QC")
-            logging.error("Current solver doesnt support problesm of type MIQC")
+            logger.error("Current solver doesnt support problesm of type MIQC")
 
     def calculate_S_matrix(self):
-        """Calculates the stoichiometric matrix (metabolites * Reactions)
+        """Calculates the stoichiometric matrix with forward and reverse half reactions.
+
+        The matrix is metabolites * Reactions, with separate columns for the forward
+        and reverse half reactions.
 
         Returns:
             Tuple  -- Tuple of reaction order, np.ndarray of stoichiometric matrix
         """
-
-        n_reactions = len(self.reactions)
-        n_metabolites = len(self.metabolites)
-        S_matrix = np.zeros((2 * n_reactions, n_metabolites))
-
-        reaction_index = 0
         rxn_order = []
         for reaction in self.reactions:
             rxn_order.append(reaction.forward_variable.name)
             rxn_order.append(reaction.reverse_variable.name)
-            for metabolite, stoic in iteritems(reaction.metabolites):
-                S_matrix[reaction_index, self.metabolites.index(metabolite)] = stoic
-                S_matrix[
-                    reaction_index + 1, self.metabolites.index(metabolite)
-                ] = -stoic
-            reaction_index = reaction_index + 2
 
-        S = np.transpose(S_matrix)
+        S = self._split_stoichiometric_matrix().toarray()
 
         return rxn_order, S
 
+    def _split_stoichiometric_matrix(self):
+        """Stoichiometric matrix with forward and reverse columns interleaved.
+
+        Columns are [S_1, -S_1, S_2, -S_2, ...].
+
+        Returns
+        -------
+        scipy.sparse.csc_matrix
+            stoichiometric matrix of the half reactions (metabolites * 2 Reactions)
+        """
+        S = self.stoichiometric_matrix
+        n_reactions = S.shape[1]
+        column_order = np.arange(2 * n_reactions).reshape(2, n_reactions).T.ravel()
+
+        return sp.hstack([S, -S], format="csc")[:, column_order]
+
     def concentration_ratio_constraints(self, ratio_metabolites, ratio_lb, ratio_ub):
         """Function to add metabolite concentration ratio constraints to the model. E.g. ratio of redox pairs
 
@@ -979,9 +1639,19 @@ class tmodel(Model):
         else:
             return []
 
-    def export_MIP_matrix(self):
-        """Creates matrices structure of the MILP problem. Quadratic constraint is not exported.
+    def export_MIP_matrix(self, sparse=False):
+        """Creates matrices structure of the MILP problem.
 
+        Quadratic constraint is not exported. Variables are ordered as fluxes (forward,
+        reverse), indicators, delG of core reactions, metabolite concentrations and
+        formation energy errors. Constraints are ordered as mass balance followed by
+        directionality, indicator and delG constraints (forward, reverse) for each core
+        reaction.
+
+        :param sparse: If True, lhs is returned as scipy.sparse.csr_matrix and rhs,
+        bounds and constraint sense as np.ndarray. The dense lhs is never created, use
+        this to export genome scale models, defaults to False
+        :type sparse: bool, optional
         :return: lhs- lhs matrix representing all constraints
                 rhs - rhs matrix
                 var_names - variable name
@@ -991,93 +1661,103 @@ class tmodel(Model):
         :rtype: Tuple
         """
 
-        rxn_var, S = self.calculate_S_matrix()
-        n_mets, rxn_tot = np.shape(S)
-        n_rxn_Excl = len(self.Exclude_reactions)
-        n_core_rxns = rxn_tot - n_rxn_Excl
+        S_split = self._split_stoichiometric_matrix().tocoo()
+        n_mets, n_rxn_vars = S_split.shape
+        core_indices = self.core_reaction_indices
+        n_core_rxns = len(core_indices)
 
-        # Create S.v = 0 and expand for other constraints
-        mass_balance = np.concatenate(
-            (S, np.zeros((n_mets, 2 * n_core_rxns + 2 * n_mets))), axis=1
-        )
-        rhs_mass_bal = [0] * n_mets
-        sense_mass_bal = ["E"] * n_mets
-
-        indicators, delGr, concentration, formation, rhs_delG, sense = (
-            [],
-            [],
-            [],
-            [],
-            [],
-            [],
-        )
-        # Intialize 6 constraints
-        delG_cons_matrix = np.zeros((2 * n_core_rxns, 3 * n_core_rxns + 2 * n_mets))
-        for reaction in self.reactions:
-            if reaction.id in self.Exclude_reactions:
-                continue
-            S_rxn = reaction.S_matrix
-            rxn_index = rxn_var.index(reaction.id)
-            # vi-vmax*zi <= 0
-            delG_cons_matrix[rxn_index, rxn_index] = 1
-            delG_cons_matrix[rxn_index + 1, rxn_index] = 1
-            delG_cons_matrix[rxn_index, rxn_index + n_core_rxns] = -Vmax
-            delG_cons_matrix[rxn_index + 1, rxn_index + n_core_rxns] = -Vmax
-            # delG - k*zi <= k
-            delG_cons_matrix[rxn_index + 2, 2 * n_core_rxns + rxn_index] = 1
-            delG_cons_matrix[rxn_index + 3, 2 * n_core_rxns + rxn_index] = 1
-            delG_cons_matrix[rxn_index + 2, n_core_rxns + rxn_index] = -K
-            delG_cons_matrix[rxn_index + 3, n_core_rxns + rxn_index] = -K
-            # delG - s.T RT ln(x) - S.T delGf = 0
-            delG_cons_matrix[rxn_index + 4, 2 * n_core_rxns + rxn_index] = 1
-            delG_cons_matrix[rxn_index + 5, 2 * n_core_rxns + rxn_index] = 1
-            delG_cons_matrix[
-                rxn_index + 4, 3 * n_core_rxns : 3 * n_core_rxns + n_mets
-            ] = -S_rxn.T
-            delG_cons_matrix[
-                rxn_index + 5, 3 * n_core_rxns : 3 * n_core_rxns + n_mets
-            ] = S_rxn.T
-            delG_cons_matrix[
-                rxn_index + 4, 3 * n_core_rxns + n_mets : 3 * n_core_rxns + 2 * n_mets
-            ] = -S_rxn.T
-            delG_cons_matrix[
-                rxn_index + 5, 3 * n_core_rxns + n_mets : 3 * n_core_rxns + 2 * n_mets
-            ] = S_rxn.T
+        # Protons are not corrected for concentration and formation error
+        proton_indices = [
+            i
+            for i, metabolite in enumerate(self.metabolites)
+            if metabolite.equilibrator_accession is not None
+            if metabolite.equilibrator_accession.inchi_key == PROTON_INCHI_KEY
+        ]
+        S_core = self.stoichiometric_matrix[:, core_indices].T.tocoo()
+        non_proton = ~np.isin(S_core.col, proton_indices)
+        thermo_rxn = S_core.row[non_proton]
+        thermo_met = S_core.col[non_proton]
+        thermo_stoic = S_core.data[non_proton]
+
+        # Column offsets of the variable blocks
+        indicator_start = n_rxn_vars
+        delG_start = indicator_start + 2 * n_core_rxns
+        concentration_start = delG_start + 2 * n_core_rxns
+        error_start = concentration_start + n_mets
+        n_vars = error_start + n_mets
+
+        # Six constraints for every core reaction, placed after the mass balance
+        first_row = n_mets + 6 * np.arange(n_core_rxns)
+        core_order = np.arange(n_core_rxns)
+        forward_flux, reverse_flux = (2 * core_indices, 2 * core_indices + 1)
+        indicator_f = indicator_start + 2 * core_order
+        indicator_r = indicator_f + 1
+        delG_f = delG_start + 2 * core_order
+        delG_r = delG_f + 1
+        ones = np.ones(n_core_rxns)
+
+        # (row, column, value) triplets of the non zero entries
+        entries = [
+            # S.v = 0
+            (S_split.row, S_split.col, S_split.data),
+            # vi - vmax * zi <= 0
+            (first_row, forward_flux, ones),
+            (first_row, indicator_f, -Vmax * ones),
+            (first_row + 1, reverse_flux, ones),
+            (first_row + 1, indicator_r, -Vmax * ones),
+            # delG + k * zi <= k
+            (first_row + 2, delG_f, ones),
+            (first_row + 2, indicator_f, K * ones),
+            (first_row + 3, delG_r, ones),
+            (first_row + 3, indicator_r, K * ones),
+            # delG - S.T RT ln(x) - S.T delGf_err = delG_prime + delG_transport
+            (first_row + 4, delG_f, ones),
+            (
+                first_row[thermo_rxn] + 4,
+                concentration_start + thermo_met,
+                -RT * thermo_stoic,
+            ),
+            (first_row[thermo_rxn] + 4, error_start + thermo_met, -thermo_stoic),
+            (first_row + 5, delG_r, ones),
+            (
+                first_row[thermo_rxn] + 5,
+                concentration_start + thermo_met,
+                RT * thermo_stoic,
+            ),
+            (first_row[thermo_rxn] + 5, error_start + thermo_met, thermo_stoic),
+        ]
+        rows, columns, values = zip(*entries)
+        lhs = sp.coo_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+            shape=(n_mets + 6 * n_core_rxns, n_vars),
+        ).tocsr()
 
+        rxn_var, indicators, delGr, rhs_delG, sense = ([], [], [], [], [])
+        for reaction in self.reactions:
+            rxn_var.extend(
+                [reaction.forward_variable.name, reaction.reverse_variable.name]
+            )
+        for i in core_indices:
+            reaction = self.reactions[i]
             indicators.extend(
                 [reaction.indicator_forward.name, reaction.indicator_reverse.name]
             )
             delGr.extend([reaction.delG_forward.name, reaction.delG_reverse.name])
-            rhs_delG.extend([0, K, 0])
-            sense.extend(["L", "L", "E"])
+            rhs = reaction.delG_prime + reaction.delG_transport
+            rhs_delG.extend([0, 0, K, K, rhs, -rhs])
+            sense.extend(["L", "L", "L", "L", "E", "E"])
 
-        lb_conc, lb_formation, ub_conc, ub_formation = ([], [], [], [])
-        for met in self.metabolites:
-            concentration.append(met.concentration_variable.name)
-            formation.append(met.compound_variable.name)
-            lb_conc.append(met.concentration_variable.lb)
-            ub_conc.append(met.concentration_variable.ub)
-            lb_formation.append(met.compound_variable.lb)
-            ub_formation.append(met.compound_variable.ub)
+        concentration = ["lnc_{}".format(met.id) for met in self.metabolites]
+        formation = ["dG_err_{}".format(met.id) for met in self.metabolites]
 
         var_names = rxn_var + indicators + delGr + concentration + formation
+        lb = np.array([self.variables[name].lb for name in var_names])
+        ub = np.array([self.variables[name].ub for name in var_names])
 
-        lhs = np.concatenate((mass_balance, delG_cons_matrix), axis=0)
-        rhs = rhs_mass_bal + rhs_delG
-        cons_sense = sense_mass_bal + sense
-        lb = (
-            [-1000] * rxn_tot
-            + [0] * n_core_rxns
-            + [-1e5] * n_core_rxns
-            + lb_conc
-            + lb_formation
-        )
-        ub = (
-            [1000] * rxn_tot
-            + [1] * n_core_rxns
-            + [1e5] * n_core_rxns
-            + ub_conc
-            + ub_formation
-        )
+        rhs = [0] * n_mets + rhs_delG
+        cons_sense = ["E"] * n_mets + sense
+
+        if sparse:
+            return (lhs, np.array(rhs), var_names, lb, ub, np.array(cons_sense))
 
-        return (lhs, rhs, var_names, np.array(lb), np.array(ub), cons_sense)
+        return (lhs.toarray(), rhs, var_names, lb, ub, cons_sense)
@@ -0,0 +1,384 @@
+"""Persistent, content addressed store of equilibrator compounds.
+
+Resolving metabolite identifiers against equilibrator's compound database is one of
+the slowest steps of building a tmodel. The store keeps the resolved compounds, with
+their microspecies, magnesium dissociation constants and component contribution
+vectors, in a SQLite file outside the installed package. Records are addressed by
+the hash of their content and identifiers point to these records, so identifiers of
+the same compound share one record. SQLite's file locking serialises concurrent
+writers, multiple worker processes can share one store safely.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+from collections import defaultdict, namedtuple
+from contextlib import closing
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+#: Environment variable to configure the directory of the compound store
+CACHE_DIR_ENV = "MULTITFA_CACHE_DIR"
+STORE_FILENAME = "compounds.sqlite"
+
+# SQLite limits the number of host parameters in a single statement
+_QUERY_BATCH_SIZE = 500
+
+
+class CompoundRecord(
+    namedtuple(
+        "CompoundRecord",
+        [
+            "compound",
+            "microspecies",
+            "magnesium_dissociation_constants",
+            "compound_vector",
+        ],
+    )
+):
+    """Equilibrator compound with the properties required for thermodynamic analysis.
+
+    Microspecies and magnesium dissociation constants are loaded before storing the
+    record, so a stored compound can be transformed without querying equilibrator's
+    database.
+
+    Parameters
+    ----------
+    compound : equilibrator_cache.Compound
+        equilibrator compound object
+    microspecies : list
+        microspecies of the compound
+    magnesium_dissociation_constants : list
+        magnesium dissociation constants of the compound
+    compound_vector : np.ndarray or None
+        component contribution decomposition vector of the compound
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_compound(cls, compound, compound_vector=None):
+        """Creates the record of an equilibrator compound.
+
+        The microspecies and magnesium dissociation constants of the compound are
+        loaded.
+
+        Parameters
+        ----------
+        compound : equilibrator_cache.Compound
+            equilibrator compound object
+        compound_vector : np.ndarray, optional
+            component contribution decomposition vector, by default None
+
+        Returns
+        -------
+        CompoundRecord
+            record of the compound
+        """
+        return cls(
+            compound=compound,
+            microspecies=compound.microspecies,
+            magnesium_dissociation_constants=compound.magnesium_dissociation_constants,
+            compound_vector=compound_vector,
+        )
+
+
+def default_store_path():
+    """Location of the compound store.
+
+    The directory is read from the 'MULTITFA_CACHE_DIR' environment variable, if not set
+    the user cache directory ($XDG_CACHE_HOME/multitfa or ~/.cache/multitfa) is used.
+
+    Returns
+    -------
+    pathlib.Path
+        path of the compound store file
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if cache_dir is None:
+        cache_dir = (
+            Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "multitfa"
+        )
+    return Path(cache_dir) / STORE_FILENAME
+
+
+class CompoundStore:
+    """On-disk store of equilibrator compound records keyed by metabolite identifier.
+
+    Identifiers are, for example, 'bigg.metabolite:atp'.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path, optional
+        path of the SQLite store file, by default `default_store_path()`
+    timeout : float, optional
+        seconds to wait for the lock of a concurrent writer, by default 60
+    """
+
+    def __init__(self, path=None, timeout=60.0):
+        self.path = Path(path) if path is not None else default_store_path()
+        self.timeout = timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS compounds "
+                "(digest TEXT PRIMARY KEY, record BLOB NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS identifiers "
+                "(identifier TEXT PRIMARY KEY, digest TEXT NOT NULL)"
+            )
+            connection.execute("COMMIT")
+
+    def __repr__(self):
+        return "<CompoundStore {}>".format(self.path)
+
+    def __len__(self):
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM identifiers").fetchone()[0]
+
+    def __contains__(self, identifier):
+        return identifier in self.get_many([identifier])
+
+    def _connect(self):
+        """Opens a new connection to the store.
+
+        Connections are not shared, so that the store can be used from forked worker
+        processes.
+
+        Returns
+        -------
+        contextlib.closing
+            context manager closing the sqlite3 connection
+        """
+        connection = sqlite3.connect(
+            str(self.path), timeout=self.timeout, isolation_level=None
+        )
+        return closing(connection)
+
+    def get(self, identifier):
+        """Retrieves the record of a single identifier.
+
+        Parameters
+        ----------
+        identifier : str
+            metabolite identifier
+
+        Returns
+        -------
+        CompoundRecord or None
+            stored record or None if the identifier is not in the store
+        """
+        return self.get_many([identifier]).get(identifier)
+
+    def get_many(self, identifiers):
+        """Retrieves the records of several identifiers in batched queries.
+
+        Parameters
+        ----------
+        identifiers : iterable of str
+            metabolite identifiers
+
+        Returns
+        -------
+        dict
+            Dictionary of identifier to CompoundRecord, missing identifiers are left out
+        """
+        identifiers = list(set(identifiers))
+        records, unpickled = ({}, {})
+        with self._connect() as connection:
+            for start in range(0, len(identifiers), _QUERY_BATCH_SIZE):
+                batch = identifiers[start : start + _QUERY_BATCH_SIZE]
+                rows = connection.execute(
+                    "SELECT identifiers.identifier, compounds.digest, compounds.record "
+                    "FROM identifiers JOIN compounds "
+                    "ON identifiers.digest = compounds.digest "
+                    "WHERE identifiers.identifier IN ({})".format(
+                        ", ".join("?" * len(batch))
+                    ),
+                    batch,
+                )
+                for identifier, digest, blob in rows:
+                    if digest not in unpickled:
+                        try:
+                            unpickled[digest] = pickle.loads(blob)
+                        except Exception:
+                            logger.warning(
+                                "Unable to read stored record of {}, ignoring".format(
+                                    identifier
+                                )
+                            )
+                            continue
+                    records[identifier] = unpickled[digest]
+        return records
+
+    def put_many(self, records):
+        """Writes records to the store in a single transaction.
+
+        Identifiers already in the store point to the new records.
+
+        Parameters
+        ----------
+        records : dict
+            Dictionary of identifier to CompoundRecord
+        """
+        if not records:
+            return
+
+        blobs, links = ({}, [])
+        for identifier, record in records.items():
+            blob = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+            digest = hashlib.sha256(blob).hexdigest()
+            blobs[digest] = blob
+            links.append((identifier, digest))
+
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(
+                    "INSERT OR IGNORE INTO compounds (digest, record) VALUES (?, ?)",
+                    [(digest, sqlite3.Binary(blob)) for digest, blob in blobs.items()],
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO identifiers (identifier, digest) "
+                    "VALUES (?, ?)",
+                    links,
+                )
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        logger.debug("{} records written to {}".format(len(links), self.path))
+
+    def import_legacy_cache(self, cache_file):
+        """Imports the compounds of the pickled cache used by earlier multitfa versions.
+
+        The cache was stored in data/compounds_cache.pickle.
+
+        Parameters
+        ----------
+        cache_file : str or pathlib.Path
+            path of the legacy pickle file
+        """
+        with open(cache_file, "rb") as handle:
+            metabolite_accessions, microspecies, mg_dissociation_data = pickle.load(
+                handle
+            )
+        self.put_many(
+            {
+                identifier: CompoundRecord(
+                    compound=compound,
+                    microspecies=microspecies.get(identifier),
+                    magnesium_dissociation_constants=mg_dissociation_data.get(
+                        identifier
+                    ),
+                    compound_vector=None,
+                )
+                for identifier, compound in metabolite_accessions.items()
+                if compound is not None
+            }
+        )
+
+
+def _parse_identifier(identifier):
+    """Splits an identifier in namespace and accession.
+
+    Identifiers are split the same way as equilibrator's CompoundCache.get_compound.
+
+    Parameters
+    ----------
+    identifier : str
+        metabolite identifier, for example 'bigg.metabolite:atp'
+
+    Returns
+    -------
+    tuple
+        namespace (None if not given) and accession
+    """
+    try:
+        namespace, accession = identifier.split(":", 1)
+    except ValueError:
+        return None, identifier
+    # Special case for ChEBI identifiers
+    if namespace == "CHEBI":
+        return "chebi", identifier
+    return namespace.lower(), accession
+
+
+def resolve_compounds(api, identifiers):
+    """Resolves metabolite identifiers against equilibrator's compound database in bulk.
+
+    Identifiers are deduplicated and grouped by namespace, each namespace is resolved
+    with batched queries that also load the compound microspecies and magnesium
+    dissociation constants. Identifiers matching more than one compound are resolved
+    individually with api.get_compound.
+
+    Parameters
+    ----------
+    api : equilibrator_api.ComponentContribution
+        equilibrator api object
+    identifiers : iterable of str
+        metabolite identifiers
+
+    Returns
+    -------
+    dict
+        Dictionary of identifier to equilibrator compound, unresolved identifiers are
+        left out
+    """
+    from equilibrator_cache.models import Compound, CompoundIdentifier, Registry
+    from sqlalchemy.orm import selectinload
+
+    accessions = defaultdict(lambda: defaultdict(list))
+    for identifier in set(identifiers):
+        namespace, accession = _parse_identifier(identifier)
+        accessions[namespace][accession].append(identifier)
+
+    compounds, ambiguous = ({}, set())
+    session = api.ccache.session
+    for namespace, namespace_accessions in accessions.items():
+        accession_list = list(namespace_accessions)
+        for start in range(0, len(accession_list), _QUERY_BATCH_SIZE):
+            batch = accession_list[start : start + _QUERY_BATCH_SIZE]
+            query = (
+                session.query(CompoundIdentifier.accession, Compound)
+                .join(Compound, Compound.id == CompoundIdentifier.compound_id)
+                .options(
+                    selectinload(Compound.microspecies),
+                    selectinload(Compound.magnesium_dissociation_constants),
+                )
+            )
+            if namespace is not None:
+                query = query.join(
+                    Registry, Registry.id == CompoundIdentifier.registry_id
+                ).filter(Registry.namespace == namespace)
+            query = query.filter(CompoundIdentifier.accession.in_(batch))
+
+            for accession, compound in query:
+                for identifier in namespace_accessions[accession]:
+                    if identifier in compounds and compounds[identifier] != compound:
+                        ambiguous.add(identifier)
+                    compounds[identifier] = compound
+
+    for identifier in ambiguous:
+        del compounds[identifier]
+        try:
+            compound = api.get_compound(identifier)
+        except Exception:
+            compound = None
+        if compound is not None:
+            compounds[identifier] = compound
+
+    logger.debug(
+        "{} of {} identifiers resolved from equilibrator".format(
+            len(compounds), sum(len(acc) for acc in accessions.values())
+        )
+    )
+    return compounds
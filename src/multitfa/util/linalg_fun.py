@@ -1,5 +1,22 @@
+from collections import namedtuple
+
 import numpy as np
-from scipy import linalg
+from scipy import linalg, stats
+
+
+CovarianceDecomposition = namedtuple(
+    "CovarianceDecomposition",
+    [
+        "component_indices",
+        "covariance",
+        "low_variance_indices",
+        "high_variance_indices",
+        "cholesky_small",
+        "cholesky_large",
+        "chi2_small",
+        "chi2_large",
+    ],
+)
 
 
 def matrix_decomposition(square_matrix):
@@ -11,3 +28,92 @@ def matrix_decomposition(square_matrix):
     cholesky = cholesky[:, independent_variables]
 
     return cholesky
+
+
+def pad_rows(matrix, row_indices, n_rows):
+    """Scatters the rows of a matrix into a zero matrix with n_rows rows.
+
+    Used to pad the cholesky factor of a variance group with empty rows for the
+    components of the other group, allocating the padded matrix once.
+
+    Parameters
+    ----------
+    matrix : np.ndarray
+        matrix to pad, one row per index in row_indices
+    row_indices : np.ndarray
+        row of the padded matrix for each row of matrix
+    n_rows : int
+        number of rows of the padded matrix
+
+    Returns
+    -------
+    np.ndarray
+        padded matrix of shape (n_rows, matrix.shape[1])
+    """
+    padded = np.zeros((n_rows, matrix.shape[1]), dtype=matrix.dtype)
+    padded[row_indices, :] = matrix
+    return padded
+
+
+def decompose_covariance(covariance, component_indices, variance_cutoff=1000):
+    """Decomposes the covariance of the components present in a model.
+
+    Components are split in low and high variance groups to avoid numerical issues, each
+    group gets its own cholesky factor and chi-square critical value. Cholesky factors
+    are padded with zero rows for the components of the other group, so both have one
+    row per model component.
+
+    Parameters
+    ----------
+    covariance : np.ndarray
+        covariance matrix of all components
+    component_indices : np.ndarray
+        indices of the components present in the model
+    variance_cutoff : float, optional
+        variance separating the low and high variance components, by default 1000
+
+    Returns
+    -------
+    CovarianceDecomposition
+        reduced covariance, variance groups and cholesky factors (None if a group is
+        empty)
+    """
+    # Sub covariance matrix containing only the components present in the model
+    component_covariance = covariance[:, component_indices][component_indices, :]
+    n_components = len(component_indices)
+
+    # Separate the compounds with variance > 1000 from the others (numerical issues)
+    variances = np.diag(component_covariance)
+    high_variance_indices = np.where(variances > variance_cutoff)[0]
+    low_variance_indices = np.where(variances < variance_cutoff)[0]
+
+    cholesky_small, chi2_small, cholesky_large, chi2_large = (None, None, None, None)
+    if len(low_variance_indices) > 0:
+        cholesky_small = matrix_decomposition(
+            component_covariance[:, low_variance_indices][low_variance_indices, :]
+        )
+        # Chi-square value to map confidence interval
+        chi2_small = stats.chi2.isf(q=0.05, df=cholesky_small.shape[1])
+
+        # Empty rows for the high variance components
+        cholesky_small = pad_rows(cholesky_small, low_variance_indices, n_components)
+
+    if len(high_variance_indices) > 0:
+        cholesky_large = matrix_decomposition(
+            component_covariance[:, high_variance_indices][high_variance_indices, :]
+        )
+        chi2_large = stats.chi2.isf(q=0.05, df=cholesky_large.shape[1])
+
+        # Empty rows for the low variance components
+        cholesky_large = pad_rows(cholesky_large, high_variance_indices, n_components)
+
+    return CovarianceDecomposition(
+        component_indices=component_indices,
+        covariance=component_covariance,
+        low_variance_indices=low_variance_indices,
+        high_variance_indices=high_variance_indices,
+        cholesky_small=cholesky_small,
+        cholesky_large=cholesky_large,
+        chi2_small=chi2_small,
+        chi2_large=chi2_large,
+    )
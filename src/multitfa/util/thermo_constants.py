@@ -1,32 +1,16 @@
+import json
+import os
+from collections import namedtuple
+from functools import lru_cache
 from pathlib import Path
 
 import numpy as np
-from component_contribution import CCModelParameters
 
 
 PROTON_INCHI_KEY = "GPRLSGONYQIRFK-UHFFFAOYSA-N"
 DATA_DIR = Path(__file__).parent.parent / "data"
 
-
-# covar_data = np.load(DATA_DIR / "covariance.npz")
-covar_data = np.load(DATA_DIR / "component_data.npz")
-
-covariance = covar_data["covariance"]
-# cholesky_small = covar_data["cholesky_low"]
-# cholesky_high = covar_data["cholesky_big"]
-# chi2_value_small = stat.chi2.isf(q=0.05, df=cholesky_small.shape[1])
-# chi2_value_high = stat.chi2.isf(q=0.05, df=cholesky_high.shape[1])
-
-params = CCModelParameters.from_quilt()
-rc_compound_ids = params.train_G.index.tolist()
-MSE_rc = params.MSE.at["rc", "MSE"]
-MSE_gc = params.MSE.at["gc", "MSE"]
 MSE_inf = 1e10
-G = params.train_G.values
-Nc = params.dimensions.at["Nc", "number"]
-Ng = params.dimensions.at["Ng", "number"]
-mu = np.hstack([params.dG0_cc, params.dG0_gc[:Ng]])
-
 
 R = 8.31e-3  # "kJ / mol / K"
 FARADAY = 96.485  # "kJ / mol"
@@ -37,3 +21,194 @@ default_I = 0.25  # , "M")
 default_pH = 7.0
 default_pMg = 10
 RT = R * default_T
+
+
+CCData = namedtuple(
+    "CCData",
+    ["rc_compound_ids", "MSE_rc", "MSE_gc", "G", "Nc", "Ng", "mu", "covariance"],
+)
+CCData.__doc__ = """Component contribution parameters used in thermodynamic analysis.
+
+rc_compound_ids : list
+    equilibrator ids of the reactant contribution training compounds
+MSE_rc, MSE_gc : float
+    mean squared error of reactant and group contributions
+G : np.ndarray
+    group incidence matrix of the training compounds
+Nc, Ng : int
+    number of reactant contribution compounds and groups
+mu : np.ndarray
+    mean formation energies of the Nc + Ng components
+covariance : np.ndarray
+    covariance of the Nc + Ng components
+"""
+
+
+#: Environment variable pointing to an offline parameter bundle, see export_cc_bundle
+CC_BUNDLE_ENV = "MULTITFA_CC_BUNDLE"
+_BUNDLE_METADATA = "metadata.json"
+_BUNDLE_ARRAYS = ("rc_compound_ids", "G", "dG0_cc", "dG0_gc", "covariance")
+
+
+@lru_cache(maxsize=None)
+def get_cc_data():
+    """Loads the component contribution parameters on first use.
+
+    If the 'MULTITFA_CC_BUNDLE' environment variable points to a parameter bundle (see
+    export_cc_bundle), the parameters are memory mapped from the bundle. Otherwise they
+    are read from equilibrator's quilt package and the covariance from
+    data/component_data.npz. The result is cached, so later calls are free.
+
+    Returns
+    -------
+    CCData
+        component contribution parameters
+    """
+    bundle = os.environ.get(CC_BUNDLE_ENV)
+    if bundle:
+        return load_cc_bundle(bundle)
+
+    from component_contribution import CCModelParameters
+
+    params = CCModelParameters.from_quilt()
+    Ng = params.dimensions.at["Ng", "number"]
+
+    # covar_data = np.load(DATA_DIR / "covariance.npz")
+    covar_data = np.load(DATA_DIR / "component_data.npz")
+    # cholesky_small = covar_data["cholesky_low"]
+    # cholesky_high = covar_data["cholesky_big"]
+    # chi2_value_small = stat.chi2.isf(q=0.05, df=cholesky_small.shape[1])
+    # chi2_value_high = stat.chi2.isf(q=0.05, df=cholesky_high.shape[1])
+
+    return CCData(
+        rc_compound_ids=params.train_G.index.tolist(),
+        MSE_rc=params.MSE.at["rc", "MSE"],
+        MSE_gc=params.MSE.at["gc", "MSE"],
+        G=params.train_G.values,
+        Nc=params.dimensions.at["Nc", "number"],
+        Ng=Ng,
+        mu=np.hstack([params.dG0_cc, params.dG0_gc[:Ng]]),
+        covariance=covar_data["covariance"],
+    )
+
+
+def write_cc_bundle(path, cc_data):
+    """Writes component contribution parameters to a bundle directory.
+
+    Arrays are stored as uncompressed .npy files, so they can be memory mapped, scalars
+    and dimensions in metadata.json.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        bundle directory, created if it doesn't exist
+    cc_data : CCData
+        component contribution parameters
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    Nc = int(cc_data.Nc)
+    arrays = {
+        "rc_compound_ids": np.asarray(cc_data.rc_compound_ids),
+        "G": np.asarray(cc_data.G),
+        "dG0_cc": np.asarray(cc_data.mu[:Nc]),
+        "dG0_gc": np.asarray(cc_data.mu[Nc:]),
+        "covariance": np.asarray(cc_data.covariance),
+    }
+    for name in _BUNDLE_ARRAYS:
+        np.save(path / "{}.npy".format(name), arrays[name], allow_pickle=False)
+
+    metadata = {
+        "Nc": Nc,
+        "Ng": int(cc_data.Ng),
+        "MSE_rc": float(cc_data.MSE_rc),
+        "MSE_gc": float(cc_data.MSE_gc),
+    }
+    with open(path / _BUNDLE_METADATA, "w") as handle:
+        json.dump(metadata, handle, indent=2)
+
+
+def export_cc_bundle(path):
+    """Exports the loaded component contribution parameters to an offline bundle.
+
+    Run once on a machine with access to equilibrator's quilt data, then point
+    'MULTITFA_CC_BUNDLE' to the bundle (or call use_cc_bundle) on machines without
+    network access.
+
+    The bundle only covers the component contribution parameters. Metabolite
+    identifiers are resolved against equilibrator's compound database, so for a fully
+    offline run the compound store (see util.compound_store) must already hold the
+    model compounds, e.g. by building the model once on the machine exporting the
+    bundle and sharing 'MULTITFA_CACHE_DIR'.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        bundle directory
+    """
+    write_cc_bundle(path, get_cc_data())
+
+
+def load_cc_bundle(path, mmap_mode="r"):
+    """Loads component contribution parameters from a bundle directory.
+
+    The covariance and group matrix are memory mapped, so worker processes on a node
+    share one page cached copy.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        bundle directory
+    mmap_mode : str, optional
+        memory map mode passed to np.load, None loads the arrays in memory, by default
+        "r"
+
+    Returns
+    -------
+    CCData
+        component contribution parameters
+    """
+    path = Path(path)
+    with open(path / _BUNDLE_METADATA) as handle:
+        metadata = json.load(handle)
+    arrays = {
+        name: np.load(path / "{}.npy".format(name), mmap_mode=mmap_mode)
+        for name in _BUNDLE_ARRAYS
+    }
+
+    return CCData(
+        rc_compound_ids=arrays["rc_compound_ids"].tolist(),
+        MSE_rc=metadata["MSE_rc"],
+        MSE_gc=metadata["MSE_gc"],
+        G=arrays["G"],
+        Nc=metadata["Nc"],
+        Ng=metadata["Ng"],
+        mu=np.hstack([arrays["dG0_cc"], arrays["dG0_gc"]]),
+        covariance=arrays["covariance"],
+    )
+
+
+def use_cc_bundle(path):
+    """Use an offline parameter bundle for the component contribution parameters.
+
+    Sets 'MULTITFA_CC_BUNDLE', so worker processes started afterwards use the bundle
+    too, and clears the cached parameters. Compounds missing from the compound store
+    are still resolved against equilibrator, see export_cc_bundle.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        bundle directory
+    """
+    os.environ[CC_BUNDLE_ENV] = str(Path(path).resolve())
+    get_cc_data.cache_clear()
+
+
+def __getattr__(name):
+    """Resolves the component contribution parameters as module attributes.
+
+    For example thermo_constants.covariance, loaded on first access.
+    """
+    if name in CCData._fields:
+        return getattr(get_cc_data(), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,20 @@
+import numpy as np
+
+from multitfa.util.compound_store import CompoundRecord, CompoundStore
+
+
+def test_store_roundtrip(tmp_path):
+    store = CompoundStore(tmp_path / "compounds.sqlite")
+    record = CompoundRecord("atp", [], [], np.ones(3))
+    store.put_many({"bigg.metabolite:atp": record, "kegg.compound:C00002": record})
+
+    assert len(store) == 2
+    assert "bigg.metabolite:atp" in store
+    assert store.get("bigg.metabolite:adp") is None
+
+    records = store.get_many(["bigg.metabolite:atp", "kegg.compound:C00002"])
+    assert records["kegg.compound:C00002"].compound == "atp"
+    assert np.all(records["bigg.metabolite:atp"].compound_vector == 1)
+
+    # A second store on the same file sees the written records
+    assert len(CompoundStore(tmp_path / "compounds.sqlite")) == 2
@@ -0,0 +1,25 @@
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from multitfa.util.thermo_constants import CCData, load_cc_bundle, write_cc_bundle
+
+
+def test_cc_bundle_roundtrip(tmp_path):
+    cc_data = CCData(
+        rc_compound_ids=[3, 5, 8],
+        MSE_rc=1.5,
+        MSE_gc=2.5,
+        G=np.eye(3),
+        Nc=2,
+        Ng=1,
+        mu=np.array([-10.0, 20.0, 5.0]),
+        covariance=np.arange(9.0).reshape(3, 3),
+    )
+    write_cc_bundle(tmp_path / "bundle", cc_data)
+    loaded = load_cc_bundle(tmp_path / "bundle")
+
+    assert isinstance(loaded.covariance, np.memmap)
+    assert loaded.rc_compound_ids == cc_data.rc_compound_ids
+    assert (loaded.Nc, loaded.Ng) == (2, 1)
+    assert_array_equal(loaded.mu, cc_data.mu)
+    assert_array_equal(loaded.covariance, cc_data.covariance)
@@ -1,3 +1,4 @@
+import importlib
 import sys
 
 import numpy as np
@@ -31,6 +32,13 @@ def test_num_cons_vars(tfa_model):
     assert num_vars == len(tfa_model.variables)
 
 
+def test_update_replaces_constraints(tfa_model):
+    num_cons = len(tfa_model.constraints)
+    timings = tfa_model.update()
+    assert set(timings) == {"generate", "remove", "add"}
+    assert len(tfa_model.constraints) == num_cons
+
+
 def test_solver_instances(tfa_model):
     if optlang.available_solvers["GUROBI"]:
         tfa_model.solver = "gurobi"
@@ -45,3 +53,177 @@ def test_solver_instances(tfa_model):
 def test_optimization(tfa_model):
     solution = tfa_model.optimize()
     assert_almost_equal(abs(solution.objective_value), 0.8739, decimal=3)
+
+
+def test_get_solution(tfa_model):
+    from multitfa.core.solution import get_solution
+
+    tfa_model.optimize(solve_method="mip")
+    primals = tfa_model.solver.primal_values
+    solution = get_solution(tfa_model)
+    assert all(name.startswith("dG_") for name in solution.Gibbs_energies.index)
+    for name, value in solution.Gibbs_energies.items():
+        assert value == primals[name]
+    rxn = tfa_model.reactions[0]
+    assert solution.fluxes[rxn.id] == primals[rxn.id] - primals[rxn.reverse_id]
+
+    # Replacing a variable keeps the number of variables but shifts the positions
+    tfa_model.remove_cons_vars([tfa_model.variables["lnc_atp_c"]])
+    tfa_model.add_cons_vars([tfa_model.problem.Variable("lnc_extra", lb=-1, ub=-1)])
+    tfa_model.slim_optimize()
+    primals = tfa_model.solver.primal_values
+    solution = get_solution(tfa_model)
+    assert solution.metabolite_concentrations["lnc_extra"] == -1
+    for name, value in solution.metabolite_concentrations.items():
+        assert value == primals[name]
+
+
+def test_stoichiometric_matrix(tfa_model):
+    S = tfa_model.stoichiometric_matrix
+    assert S.shape == (len(tfa_model.metabolites), len(tfa_model.reactions))
+    rxn_index = tfa_model.reactions.index("ATPS4r")
+    assert S[tfa_model.metabolites.index("atp_c"), rxn_index] == 1
+    assert S[tfa_model.metabolites.index("adp_c"), rxn_index] == -1
+
+    rxn_order, S_split = tfa_model.calculate_S_matrix()
+    assert len(rxn_order) == S_split.shape[1] == 2 * len(tfa_model.reactions)
+    assert_almost_equal(S_split[:, 0::2], S.toarray())
+    assert_almost_equal(S_split[:, 1::2], -S.toarray())
+
+
+def test_stoichiometric_matrix_context(tfa_model):
+    shape = tfa_model.stoichiometric_matrix.shape
+    with tfa_model:
+        tfa_model.remove_reactions([tfa_model.reactions.get_by_id("PGK")])
+        assert tfa_model.stoichiometric_matrix.shape == (shape[0], shape[1] - 1)
+    assert tfa_model.stoichiometric_matrix.shape == shape
+    rxn = tfa_model.reactions.get_by_id("ATPS4r")
+    assert rxn.cal_stoichiometric_matrix()[tfa_model.metabolites.index("atp_c")] == 1
+
+
+def test_export_MIP_matrix_sparse(tfa_model):
+    lhs, rhs, var_names, lb, ub, sense = tfa_model.export_MIP_matrix()
+    lhs_sp, rhs_sp, var_names_sp, lb_sp, ub_sp, sense_sp = tfa_model.export_MIP_matrix(
+        sparse=True
+    )
+    assert lhs.shape == lhs_sp.shape == (len(rhs), len(var_names))
+    assert_almost_equal(lhs_sp.toarray(), lhs)
+    assert_almost_equal(rhs_sp, rhs)
+    assert var_names_sp == var_names
+    assert list(sense_sp) == sense
+
+
+def test_shared_compound_records(tfa_model):
+    h2o_c = tfa_model.metabolites.get_by_id("h2o_c")
+    h2o_e = tfa_model.metabolites.get_by_id("h2o_e")
+    assert h2o_c.equilibrator_accession is h2o_e.equilibrator_accession
+    assert h2o_c.Kegg_id in tfa_model.compound_store
+
+
+def test_warm_build_skips_equilibrator(tfa_model, monkeypatch):
+    # The fixture build leaves every model compound in the store
+    def get_api():
+        raise RuntimeError("equilibrator api requested on a warm build")
+
+    monkeypatch.setattr(
+        importlib.import_module("multitfa.core.tmodel"), "get_api", get_api
+    )
+    warm_model = build_test_model()
+    assert len(warm_model.constraints) == len(tfa_model.constraints)
+
+
+def test_covariance_decomposition(tfa_model):
+    # update() only needs the standard deviations, the decomposition is lazy
+    assert not getattr(tfa_model, "_covariance_decompositions", None)
+    decomposition = tfa_model.covariance_decomposition
+    assert tfa_model.covariance_decomposition is decomposition
+    n_components = len(decomposition.component_indices)
+    assert decomposition.covariance.shape == (n_components, n_components)
+    if decomposition.cholesky_small is not None:
+        assert decomposition.cholesky_small.shape[0] == n_components
+        assert_almost_equal(
+            np.abs(decomposition.cholesky_small[decomposition.high_variance_indices]),
+            0,
+        )
+
+
+def test_compound_vector_matrix_context(tfa_model):
+    shape = tfa_model.compound_vector_matrix.shape
+    with tfa_model:
+        tfa_model.remove_metabolites([tfa_model.metabolites.get_by_id("atp_c")])
+        assert tfa_model.compound_vector_matrix.shape == (shape[0] - 1, shape[1])
+    assert tfa_model.compound_vector_matrix.shape == shape
+
+
+def test_calculate_std_dev(tfa_model):
+    from multitfa.util.thermo_constants import get_cc_data
+
+    std_devs = tfa_model.calculate_std_dev()
+    atp = tfa_model.metabolites.get_by_id("atp_c")
+    variance = atp.compound_vector @ get_cc_data().covariance @ atp.compound_vector.T
+    assert_almost_equal(
+        std_devs[tfa_model.metabolites.index(atp)], np.sqrt(variance[0][0])
+    )
+    assert atp.std_dev == std_devs[tfa_model.metabolites.index(atp)]
+
+
+def test_calculate_delG_f(tfa_model):
+    delG_f = tfa_model.calculate_delG_f()
+    atp = tfa_model.metabolites.get_by_id("atp_c")
+    assert_almost_equal(
+        delG_f[tfa_model.metabolites.index(atp)], atp.calculate_delG_f()
+    )
+    rxn = tfa_model.reactions.get_by_id("ATPS4r")
+    assert_almost_equal(
+        rxn.delG_prime,
+        sum(stoic * met.calculate_delG_f() for met, stoic in rxn.metabolites.items()),
+    )
+
+
+def test_variable_registry(tfa_model):
+    registry = tfa_model.variable_registry
+    assert registry.names("concentration") == [
+        var.name for var in tfa_model.variables if var.name.startswith("lnc_")
+    ]
+    assert len(registry["indicator"]) == len(
+        [var for var in tfa_model.variables if var.name.startswith("indicator_")]
+    )
+
+    sphere = tfa_model.problem.Variable("Sphere_s_0", lb=-1, ub=1)
+    with tfa_model:
+        tfa_model.add_cons_vars([sphere])
+        assert registry["sphere_small"][0] is tfa_model.variables["Sphere_s_0"]
+        assert registry.index("sphere_small", "Sphere_s_0") == 0
+    assert len(registry["sphere_small"]) == 0
+
+    error = registry["error"][0]
+    tfa_model.remove_cons_vars([error])
+    assert error.name not in registry.names("error")
+
+
+def test_patch_delG_constraints(tfa_model):
+    rxn = tfa_model.reactions.get_by_id("ATPS4r")
+    with tfa_model:
+        rxn.delG_prime = -25.0
+        forward, reverse = rxn.delG_constraint
+        assert forward.lb == forward.ub == -25.0 + rxn.delG_transport
+        assert reverse.lb == reverse.ub == 25.0 - rxn.delG_transport
+    assert_almost_equal(rxn.delG_constraint[0].lb, rxn.delG_prime + rxn.delG_transport)
+
+
+def test_set_compartment_pH(tfa_model):
+    rxn = tfa_model.reactions.get_by_id("ATPS4r")
+    delG_prime, rhs = (rxn.delG_prime, rxn.delG_constraint[0].lb)
+    with tfa_model:
+        patched = tfa_model.set_compartment_pH("c", 7.0)
+        assert "delG_{}".format(rxn.forward_variable.name) in patched
+        assert rxn.delG_prime != delG_prime
+        assert_almost_equal(
+            rxn.delG_constraint[0].lb, rxn.delG_prime + rxn.delG_transport
+        )
+    assert tfa_model.compartment_info.loc["c", "pH"] == 7.5
+    assert rxn.delG_prime == delG_prime
+    assert rxn.delG_constraint[0].lb == rhs
+
+    tfa_model.set_compartment_pH("c", 7.0)
+    assert rxn.delG_prime != delG_prime
@@ -1,4 +1,7 @@
+import time
+
 import numpy as np
+import optlang
 import pytest
 
 from multitfa.analysis import generate_n_sphere_sample, preprocess_model
@@ -9,6 +12,23 @@ def test_sphere():
     assert abs(np.sqrt(np.sum(np.square(sphere_sample))) - 1) < 1e-3
 
 
+@pytest.mark.parametrize("sobol", [False, True])
+def test_sphere_sampler(sobol):
+    from multitfa.analysis import SphereSampler
+
+    samples = [
+        [next(sampler) for _ in range(20)]
+        for sampler in (
+            SphereSampler([3, 5], seed=42, block_size=8, sobol=sobol),
+            SphereSampler([3, 5], seed=42, block_size=8, sobol=sobol),
+        )
+    ]
+    small, large = (np.array(sphere) for sphere in zip(*samples[0]))
+    assert small.shape == (20, 3) and large.shape == (20, 5)
+    assert np.allclose(np.linalg.norm(large, axis=1), 1)
+    assert np.array_equal(small, np.array([sample[0] for sample in samples[1]]))
+
+
 from .load_test_model import build_test_model
 
 
@@ -26,3 +46,190 @@ def test_preprocess(tfa_model):
         if var.name.startswith("component_") or var.name.startswith("dG_err_")
     ]
     assert check_vars == []
+
+
+def test_pad_rows():
+    from multitfa.util.linalg_fun import pad_rows
+
+    matrix = np.arange(6, dtype=float).reshape(3, 2)
+    padded = pad_rows(matrix, np.array([0, 2, 3]), 5)
+    expected = matrix
+    for i in [1, 4]:
+        expected = np.insert(expected, i, np.zeros(2), axis=0)
+    assert np.array_equal(padded, expected)
+
+
+def test_variability_processes(tfa_model):
+    from multitfa.analysis import variability
+
+    variables = ["ATPS4r", "PGK", "PYK"]
+    serial = variability(tfa_model, variable_list=variables, processes=1)
+    parallel = variability(tfa_model, variable_list=variables, processes=2)
+    assert list(parallel.index) == variables
+    assert np.allclose(serial.values, parallel.values, atol=1e-6)
+
+
+def test_variability_warm_start(tfa_model):
+    from multitfa.analysis import adjacency_order, variability
+
+    variables = ["ATPS4r", "lnc_atp_c", "PGK", "dG_PYK", "not_a_variable"]
+    order = adjacency_order(tfa_model, variables)
+    assert sorted(order) == sorted(variables)
+    assert order[-1] == "not_a_variable"
+
+    cold = variability(tfa_model, variable_list=variables[:4], processes=1)
+    warm = variability(
+        tfa_model, variable_list=variables[:4], processes=1, warm_start=True
+    )
+    assert list(warm.index) == variables[:4]
+    assert np.allclose(cold.values, warm.values, atol=1e-6)
+
+
+def test_variability_prescreen(tfa_model):
+    from multitfa.analysis import variability
+
+    variables = ["ATPS4r", "PGK", "dG_PYK", "indicator_PGK"]
+    reference = variability(tfa_model, variable_list=variables, processes=1)
+    prescreened = variability(
+        tfa_model, variable_list=variables, processes=1, prescreen=True
+    )
+    assert np.allclose(reference.values, prescreened.values, atol=1e-6)
+    statistics = prescreened.attrs["statistics"]
+    assert statistics["milp_solves"] + statistics["avoided_solves"] == 8
+
+
+def test_variability_shared_envelope(tfa_model):
+    from multitfa.analysis import variability
+
+    variables = ["ATPS4r", "PGK", "dG_PYK", "lnc_atp_c"]
+    serial = variability(tfa_model, variable_list=variables, processes=1)
+    parallel = variability(
+        tfa_model, variable_list=variables, processes=2, prescreen=True
+    )
+    assert np.allclose(serial.values, parallel.values, atol=1e-6)
+
+
+def test_variability_log(tmp_path):
+    from multitfa.analysis import VariabilityLog
+
+    log = VariabilityLog(tmp_path / "tva.sqlite")
+    log.append("PGK", -10.0, 5.0, "optimal", "optimal", 0.1)
+    log.append("PYK", float("nan"), 3.0, "infeasible", "optimal", 0.2)
+    log.append("PGK", -12.0, 5.0, "optimal", "optimal", 0.1)
+    completed = VariabilityLog(tmp_path / "tva.sqlite").completed()
+    assert len(log) == 2
+    assert completed["PGK"] == (-12.0, 5.0)
+    assert np.isnan(completed["PYK"][0])
+
+    log.validate("a")
+    VariabilityLog(tmp_path / "tva.sqlite").validate("a")
+    with pytest.raises(ValueError):
+        log.validate("b")
+
+
+def test_variability_checkpoint(tfa_model, tmp_path):
+    from multitfa.analysis import VariabilityLog, variability
+
+    variables = ["ATPS4r", "PGK", "dG_PYK"]
+    log = VariabilityLog(tmp_path / "tva.sqlite")
+    first = variability(
+        tfa_model, variable_list=variables[:2], processes=1, checkpoint=log
+    )
+    assert len(log) == 2
+
+    resumed = variability(
+        tfa_model, variable_list=variables, processes=1, checkpoint=log
+    )
+    assert resumed.attrs["statistics"]["resumed_variables"] == 2
+    assert resumed.attrs["statistics"]["milp_solves"] == 2
+    assert np.allclose(resumed.loc[variables[:2]].values, first.values)
+    assert len(log) == 3
+
+    # The log of another model is refused
+    tfa_model.reactions.get_by_id("PGK").lower_bound = 0
+    with pytest.raises(ValueError):
+        variability(tfa_model, variable_list=variables, processes=1, checkpoint=log)
+
+
+def test_model_fingerprint(tfa_model):
+    from multitfa.analysis import model_fingerprint
+
+    fingerprint = model_fingerprint(tfa_model)
+    assert model_fingerprint(tfa_model) == fingerprint
+    assert model_fingerprint(tfa_model, params=True) != fingerprint
+
+    # Coefficient changes with unchanged bounds give another fingerprint
+    constraint = tfa_model.constraints["delG_PYK"]
+    variable = tfa_model.variables["dG_PYK"]
+    coefficient = constraint.get_linear_coefficients([variable])[variable]
+    constraint.set_linear_coefficients({variable: 2 * coefficient})
+    assert model_fingerprint(tfa_model) != fingerprint
+
+
+def test_variability_callback(tfa_model):
+    from multitfa.analysis import solve_report, variability
+
+    variables = ["ATPS4r", "PGK", "dG_PYK"]
+    records = []
+    ranges = variability(
+        tfa_model, variable_list=variables, processes=1, callback=records.append
+    )
+    assert records == ranges.attrs["solves"]
+    assert sorted((record.variable, record.sense) for record in records) == sorted(
+        (variable, sense) for variable in variables for sense in ("min", "max")
+    )
+    assert not any(record.time_limit for record in records)
+
+    report = solve_report(records, n_slowest=2)
+    assert len(report) == 2
+    assert report["solve_time"].is_monotonic_decreasing
+    assert (solve_report(records, n_slowest=None)["solves"] == 2).all()
+
+
+@pytest.mark.skipif(not optlang.available_solvers["GUROBI"], reason="requires gurobi")
+def test_variability_legacy_solve_time(tfa_model):
+    from multitfa.analysis import variability_legacy_gurobi
+
+    tfa_model.solver = "gurobi"
+    start = time.perf_counter()
+    ranges = variability_legacy_gurobi(tfa_model, variable_list=["ATPS4r", "PGK"])
+    wall_time = time.perf_counter() - start
+    # Solves after the first one use the indicators of the last minimization as start
+    assert len(ranges.attrs["solves"]) == 4
+    for record in ranges.attrs["solves"]:
+        assert 0 <= record.solve_time < wall_time
+
+
+def test_cutoff_sampling_processes(tfa_model):
+    from multitfa.analysis import cutoff_sampling
+
+    variables = ["ATPS4r", "PGK"]
+    serial = cutoff_sampling(
+        tfa_model, cutoff=2, variable_list=variables, seed=0, processes=1
+    )
+    parallel = cutoff_sampling(
+        tfa_model, cutoff=2, variable_list=variables, seed=0, processes=2
+    )
+    assert serial[2] == parallel[2]
+    assert serial[1].shape == (2, 2 * serial[2])
+    assert np.allclose(serial[1].values, parallel[1].values, atol=1e-6)
+
+
+@pytest.mark.parametrize("memory_mapped", [False, True])
+def test_range_buffer(tmp_path, memory_mapped):
+    from pandas import DataFrame
+
+    from multitfa.analysis import RangeBuffer
+
+    variables = ["PGK", "PYK", "ATPS4r"]
+    path = tmp_path / "ranges.dat" if memory_mapped else None
+    buffer = RangeBuffer(variables, capacity=2, path=path)
+    samples = np.random.default_rng(0).normal(size=(5, 3, 2))
+    for sample in samples:
+        ranges = DataFrame(sample, index=variables, columns=["minimum", "maximum"])
+        # Rows in another order are aligned to the buffer variables
+        buffer.append(ranges.iloc[::-1])
+    frame = buffer.to_frame()
+    assert len(buffer) == 5
+    assert np.array_equal(frame["minimum"].values, samples[:, :, 0].T)
+    assert np.array_equal(frame.loc["PYK", "maximum"].values, samples[:, 1, 1])